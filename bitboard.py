@@ -0,0 +1,235 @@
+# bitboard.py
+# Compact bitboard representation of a Connect Four position.
+#
+# Each column of the board is stored in (rows + 1) consecutive bits of a
+# Python integer, with the extra bit acting as a sentinel above the top row.
+# For the standard 6x7 board, the bit layout looks like this:
+#
+#     .  .  .  .  .  .  .
+#     5 12 19 26 33 40 47
+#     4 11 18 25 32 39 46
+#     3 10 17 24 31 38 45
+#     2  9 16 23 30 37 44
+#     1  8 15 22 29 36 43
+#     0  7 14 21 28 35 42
+#
+# With this layout, four-in-a-row detection reduces to a handful of shifts
+# and bitwise ANDs, and moves can be made and unmade in constant time.
+
+import numpy as np
+
+
+class Bitboard:
+    """A Connect Four position stored as two bitmasks plus column heights.
+
+    Parameters
+    ----------
+    rows : int
+        Number of rows on the board (default=6).
+    cols : int
+        Number of columns on the board (default=7).
+
+    Attributes
+    ----------
+    masks : list of ints
+        Bitmask of the discs owned by each player (index 0=player1, 1=player2).
+    heights : list of ints
+        Bit index of the next free cell in each column.
+    turn : int
+        The player index (0-indexing) whose turn it is.
+    moves : list of ints
+        Stack of columns (0-indexing) played since the position was created.
+    """
+
+    def __init__(self, rows=6, cols=7):
+        self.rows = rows
+        self.cols = cols
+        self.height = rows + 1  # bits per column, including the sentinel
+        self.masks = [0, 0]
+        self.heights = [col * self.height for col in range(cols)]
+        self.turn = 0
+        self.nmoves = 0
+        self.moves = []
+
+        # Precompute masks that depend only on the board size
+        self.bottom = sum(1 << (col * self.height) for col in range(cols))
+        self.full = self.bottom * ((1 << rows) - 1)
+        self.tops = [(col * self.height) + rows for col in range(cols)]
+        self.directions = (1, self.height, self.height - 1, self.height + 1)
+
+    def __repr__(self):
+        return f"Bitboard(rows={self.rows}, cols={self.cols}, moves={self.nmoves})"
+
+    def __str__(self):
+        return '\n'.join(''.join(str(v) for v in row) for row in np.flipud(self.to_array()))
+
+    @classmethod
+    def from_array(cls, board):
+        """Build a bitboard from the NumPy board layout used by utils.
+
+        Parameters
+        ----------
+        board : np.array of ints
+            2D array for the current state of the board (0=empty, 1=player1, 2=player2).
+
+        Returns
+        -------
+        bb : Bitboard
+            The equivalent bitboard position.
+        """
+        rows, cols = board.shape
+        bb = cls(rows, cols)
+        for col in range(cols):
+            for row in range(rows):
+                value = board[row, col]
+                if value == 0:
+                    break
+                bb.masks[int(value) - 1] |= 1 << bb.heights[col]
+                bb.heights[col] += 1
+                bb.nmoves += 1
+
+        # Same convention as connect4.play: player 2 moves when player 1 is ahead
+        bb.turn = 1 if bin(bb.masks[0]).count('1') > bin(bb.masks[1]).count('1') else 0
+        return bb
+
+    def to_array(self):
+        """Convert the bitboard back to the NumPy board layout used by utils.
+
+        Returns
+        -------
+        board : np.array of ints
+            2D array for the current state of the board (0=empty, 1=player1, 2=player2).
+        """
+        board = np.zeros((self.rows, self.cols), dtype=int)
+        for col in range(self.cols):
+            base = col * self.height
+            for row in range(self.heights[col] - base):
+                board[row, col] = 1 if self.masks[0] >> (base + row) & 1 else 2
+        return board
+
+    def copy(self):
+        """Return an independent copy of this position."""
+        bb = Bitboard.__new__(Bitboard)
+        bb.__dict__.update(self.__dict__)
+        bb.masks = self.masks[:]
+        bb.heights = self.heights[:]
+        bb.moves = self.moves[:]
+        return bb
+
+    @property
+    def mask(self):
+        """Bitmask of every occupied cell."""
+        return self.masks[0] | self.masks[1]
+
+    def can_play(self, col):
+        """Is there at least one open row in a column (0-indexing)?"""
+        return 0 <= col < self.cols and self.heights[col] < self.tops[col]
+
+    def get_next_available_rows(self, invalid=-1):
+        """Find the row index for the next disc in every column (see utils)."""
+        return np.array([h - col * self.height if h < self.tops[col] else invalid
+                         for col, h in enumerate(self.heights)])
+
+    def get_valid_moves(self):
+        """List the columns (0-indexing) that are not full yet."""
+        return [col for col in range(self.cols) if self.heights[col] < self.tops[col]]
+
+    def legal_mask(self):
+        """Bitmask of the cells in which the next disc could land."""
+        return (self.mask + self.bottom) & self.full
+
+    def play(self, col):
+        """Drop a disc for the side to move in a column (0-indexing).
+
+        Returns
+        -------
+        row : int
+            The row index the disc landed in.
+        """
+        bit = self.heights[col]
+        self.masks[self.turn] |= 1 << bit
+        self.heights[col] = bit + 1
+        self.turn ^= 1
+        self.nmoves += 1
+        self.moves.append(col)
+        return bit - col * self.height
+
+    def undo(self):
+        """Take back the most recent move made with play().
+
+        Returns
+        -------
+        col : int
+            The column (0-indexing) that was unplayed.
+        """
+        col = self.moves.pop()
+        self.turn ^= 1
+        self.nmoves -= 1
+        self.heights[col] -= 1
+        self.masks[self.turn] &= ~(1 << self.heights[col])
+        return col
+
+    def connected(self, pos):
+        """Does a bitmask of discs contain four in a row?"""
+        for shift in self.directions:
+            pairs = pos & (pos >> shift)
+            if pairs & (pairs >> (2 * shift)):
+                return True
+        return False
+
+    def is_winner(self, player):
+        """Check to see if a specific player (using 1-indexing!) has connected four discs."""
+        return self.connected(self.masks[player - 1])
+
+    def is_winning_move(self, col):
+        """Would dropping a disc in a column (0-indexing) win for the side to move?"""
+        return self.connected(self.masks[self.turn] | (1 << self.heights[col]))
+
+    def is_gameover(self):
+        """Check to see if the game is over yet (same outputs as utils.is_gameover)."""
+        if self.connected(self.masks[0]):
+            return True, 1
+        if self.connected(self.masks[1]):
+            return True, 2
+        if self.legal_mask() == 0:
+            return True, 0
+        return False, -1
+
+    def key(self):
+        """Unique integer identifying the position (independent of move order)."""
+        return self.masks[0] + self.mask + self.bottom
+
+    def mirror_bits(self, bits):
+        """Reverse the order of the columns in a bitmask (left-right mirror image)."""
+        column = (1 << self.height) - 1
+        mirrored = 0
+        for col in range(self.cols):
+            mirrored |= ((bits >> (col * self.height)) & column) << ((self.cols - 1 - col) * self.height)
+        return mirrored
+
+    def mirror(self):
+        """Return the mirror image of this position (columns reversed)."""
+        bb = self.copy()
+        bb.masks = [self.mirror_bits(m) for m in self.masks]
+        bb.heights = [col * self.height + (self.heights[self.cols - 1 - col] - (self.cols - 1 - col) * self.height)
+                      for col in range(self.cols)]
+        bb.moves = [self.cols - 1 - col for col in self.moves]
+        return bb
+
+    def mirror_key(self):
+        """Key of the mirror image of this position (see key)."""
+        return self.mirror_bits(self.masks[0] + self.mask) + self.bottom
+
+    def canonical_key(self):
+        """Key shared by this position and its mirror image.
+
+        Returns
+        -------
+        key : int
+            The smaller of key() and mirror_key().
+        mirrored : bool
+            True if the key belongs to the mirror image, in which case moves found for the
+            key must be mirrored (col -> cols - 1 - col) to apply to this position.
+        """
+        key, mirrored = self.key(), self.mirror_key()
+        return (mirrored, True) if mirrored < key else (key, False)
@@ -0,0 +1,228 @@
+# book.py
+# Build and read opening books for Connect Four AI players.
+#
+# An opening book stores the move an AI player chose, after a long search,
+# for every position reachable in the first few plies of the game. Searching
+# is done once, offline; during a game, players look up the answer instead.
+#
+# The book is a compact binary file: a small header followed by the sorted
+# 64-bit position keys and one byte per position for the move. A position and
+# its mirror image share one entry (see utils.canonicalize). Lookups
+# memory-map the file, so opening a book costs almost nothing, and only the
+# pages that are actually read are loaded from disk.
+#
+# Example:
+#     $ python book.py players/minimax.py --plies 4 --time 2 -o books/minimax-6x7.book
+
+import argparse
+import hashlib
+from multiprocessing import Pool
+import numpy as np
+import os
+import sys
+import time
+from bitboard import Bitboard
+import utils
+
+# NOTE: connect4 is imported only where it is needed (building a book), so that AI
+# players can read books without importing the game itself.
+
+MAGIC = b'C4BOOK02'
+HEADER = np.dtype([('magic', 'S8'), ('rows', '<u4'), ('cols', '<u4'), ('plies', '<u4'), ('count', '<u4')])
+NO_MOVE = 255 # stored for positions the player could not find a move for
+
+parser = argparse.ArgumentParser(description="Build an opening book for a Connect Four AI player.")
+parser.add_argument('player', type=str, help="name (e.g., minimax) or filename of the AI player whose moves are stored in the book")
+parser.add_argument('-p', '--plies', type=int, help="number of plies (moves by either player) covered by the book (default=4)", default=4)
+parser.add_argument('-t', '--time', type=float, help="time allowed for each search, in seconds (default=2)", default=2.0)
+parser.add_argument('-r', '--rows', type=int, help="number of rows on the board (default=6)", default=6)
+parser.add_argument('-c', '--cols', type=int, help="number of columns on the board (default=7)", default=7)
+parser.add_argument('-o', '--output', type=str, help="filename for the book (default=books/<player>-<rows>x<cols>.book)")
+parser.add_argument('-w', '--workers', type=int, help="number of worker processes (default=number of cores)", default=os.cpu_count())
+parser.add_argument('--verbose', action='store_true', help="display progress, including output from the AI player")
+
+_ENGINE = None # AI player in each worker process (see engine.py)
+
+def main(args):
+    from registry import REGISTRY
+    name = os.path.splitext(os.path.basename(REGISTRY.path(args.player)))[0] # a short name (e.g., minimax) or a filename
+    output = args.output or os.path.join(utils.ROOT, 'books', f'{name}-{args.rows}x{args.cols}.book')
+
+    positions = get_positions(args.rows, args.cols, args.plies)
+    if args.verbose: print(f"Searching {len(positions)} positions for {name} using {args.workers} worker(s)...")
+
+    start = time.time()
+    tasks = [(bb.to_array(), bb.turn, args.time) for bb in positions]
+    with Pool(args.workers, initializer=init_worker, initargs=(args.player, args.verbose)) as pool:
+        moves = pool.map(search, tasks, chunksize=1)
+    if args.verbose: print(f"Finished in {time.time() - start:.1f} seconds.")
+
+    write_book(output, positions, moves, args.plies)
+    print(f"Saved {len(positions)} positions to {output}")
+
+def get_positions(rows, cols, plies):
+    """List every position that can arise in the first few plies of a game.
+
+    Parameters
+    ----------
+    rows : int
+        Number of rows on the board.
+    cols : int
+        Number of columns on the board.
+    plies : int
+        Positions with fewer discs than this are included.
+
+    Returns
+    -------
+    positions : list of Bitboards
+        Every distinct position (regardless of move order, and counting mirror images
+        as the same position) in which the game is not over yet.
+    """
+    positions = []
+    frontier = {0: Bitboard(rows, cols)}
+    for ply in range(plies):
+        positions.extend(frontier.values())
+        children = {}
+        for bb in frontier.values():
+            for col in bb.get_valid_moves():
+                if bb.is_winning_move(col):
+                    continue
+                child = bb.copy()
+                child.play(col)
+                children.setdefault(position_key(child)[0], child)
+        frontier = children
+    return positions
+
+def init_worker(player, verbose=False):
+    """Load the AI player once in each worker process (silenced unless verbose)."""
+    global _ENGINE
+    if not verbose:
+        sys.stdout = open(os.devnull, 'w')
+    players = utils.load_players(player, player)
+    _ENGINE = players['engine'][0]
+    if hasattr(players['ai'][0], 'USE_BOOK'): # search every position, rather than reading an older book
+        players['ai'][0].USE_BOOK = False
+
+def position_key(bb):
+    """64-bit key for a position (the same for every move order that reaches it, and for its mirror image).
+
+    Parameters
+    ----------
+    bb : Bitboard
+        The position.
+
+    Returns
+    -------
+    key : int
+        The exact canonical key (see utils.canonicalize) if it fits in 64 bits (boards with
+        up to 64 cells, counting one extra row); otherwise, a 64-bit hash of it.
+    mirrored : bool
+        True if the key belongs to the mirror image of the position.
+    """
+    key, mirrored = utils.canonicalize(bb)
+    if key >= 2**64:
+        data = key.to_bytes((key.bit_length() + 7) // 8, 'little')
+        key = int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+    return key, mirrored
+
+def search(task):
+    """Ask the AI player for its move in one position (run in a worker process); None if it fails."""
+    import connect4
+    board, player, timeout = task
+    try:
+        _ENGINE.new_game(board, player)
+        return connect4.get_engine_move(_ENGINE, timeout) - 1
+    except Exception:
+        return None
+
+def write_book(filename, positions, moves, plies=0):
+    """Save an opening book to file.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the file to create.
+    positions : list of Bitboards
+        Positions in the book (all on the same board size), with no two mirror images.
+    moves : list of ints
+        Column (0-indexing) to play in each position (None for no move).
+    plies : int
+        Number of plies covered by the book, stored for reference (default=0).
+    """
+    rows, cols = (positions[0].rows, positions[0].cols) if positions else (0, 0)
+    entries = [position_key(bb) for bb in positions]
+    keys = np.array([key for key, _ in entries], dtype='<u8')
+    moves = [utils.mirror_move(move, cols, mirrored) for move, (_, mirrored) in zip(moves, entries)] # store moves for the keyed orientation
+    moves = np.array([NO_MOVE if m is None else m for m in moves], dtype='u1')
+    order = np.argsort(keys, kind='stable')
+
+    header = np.array([(MAGIC, rows, cols, plies, len(keys))], dtype=HEADER)
+    os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+    with open(filename, 'wb') as f:
+        f.write(header.tobytes())
+        f.write(keys[order].tobytes())
+        f.write(moves[order].tobytes())
+
+class Book:
+    """Read-only, memory-mapped opening book.
+
+    Parameters
+    ----------
+    filename : str
+        Name of a file created by write_book.
+    """
+
+    def __init__(self, filename):
+        header = np.fromfile(filename, dtype=HEADER, count=1)
+        if len(header) == 0 or header[0]['magic'] != MAGIC:
+            raise Exception(f'ERROR: {filename} is not an opening book.')
+        self.filename = filename
+        self.rows, self.cols, self.plies, count = (int(header[0][k]) for k in ('rows', 'cols', 'plies', 'count'))
+        if count:
+            self.keys = np.memmap(filename, dtype='<u8', mode='r', offset=HEADER.itemsize, shape=(count,))
+            self.moves = np.memmap(filename, dtype='u1', mode='r', offset=HEADER.itemsize + 8 * count, shape=(count,))
+        else:
+            self.keys = np.zeros(0, dtype='<u8')
+            self.moves = np.zeros(0, dtype='u1')
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __repr__(self):
+        return f"Book('{self.filename}', rows={self.rows}, cols={self.cols}, plies={self.plies}, positions={len(self)})"
+
+    def lookup(self, board, which_player=None):
+        """Find the stored move for a position.
+
+        Parameters
+        ----------
+        board : np.array of ints or Bitboard
+            The current state of the board.
+        which_player : int or None
+            The player index (0-indexing) to move. The book only holds positions reached by
+            taking turns, so there is no move for the other player (e.g., after a lost turn).
+            If None, the player is worked out from the board.
+
+        Returns
+        -------
+        col : int or None
+            The column (0-indexing) stored for the position, or None if it is not in the book.
+        """
+        bb = board if isinstance(board, Bitboard) else Bitboard.from_array(board)
+        if (bb.rows, bb.cols) != (self.rows, self.cols) or bb.nmoves >= self.plies:
+            return None
+        if which_player is not None and which_player != bb.turn:
+            return None
+        key, mirrored = position_key(bb)
+        key = np.uint64(key)
+        i = np.searchsorted(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key and self.moves[i] != NO_MOVE:
+            col = utils.mirror_move(int(self.moves[i]), self.cols, mirrored)
+            if bb.can_play(col): # guards against (very unlikely) hash collisions on large boards
+                return col
+        return None
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    utils.check_args(args)
+    main(args)
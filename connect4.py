@@ -9,14 +9,25 @@
 # Author: Matthew Eicholtz
 
 import argparse
-from copy import deepcopy
 import numpy as np
 import pdb
+import threading
 import time
 import utils
 
 DELAY = 0.1  # default time to wait between things, in seconds
 TIMEOUT = 5  # maximum time per move, in seconds
+MAX_PASSES = 6  # turns lost in a row (by either player) that end the game with no winner
+BUSY = {}  # AI calls that ran out of time but are still running, keyed by owner (see run_with_timeout)
+
+class VersionAction(argparse.Action):
+    """Print the version and exit, like action='version', but only look it up (with git) when asked."""
+
+    def __init__(self, option_strings, dest=argparse.SUPPRESS, default=argparse.SUPPRESS, help="show program's version number and exit"):
+        super().__init__(option_strings, dest, nargs=0, default=default, help=help)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        parser.exit(message=utils.get_version() + '\n')
 
 parser = argparse.ArgumentParser(description="Play Connect Four in Python!")
 parser.add_argument('--player1', metavar='p1', type=str, help="either 'human' (default) or the name of an AI file", default='human')
@@ -24,9 +35,12 @@ parser.add_argument('--player2', metavar='p2', type=str, help="either 'human' (d
 parser.add_argument('-r', '--rows', type=int, help="number of rows on the board (default=6)", default=6)
 parser.add_argument('-c', '--cols', type=int, help="number of columns on the board (default=7)", default=7)
 parser.add_argument('-b', '--board', type=str, help="filename containing starting board state")
+parser.add_argument('-t', '--timeout', type=float, help=f"maximum time per AI move, in seconds (default={TIMEOUT}, 0=unlimited)", default=TIMEOUT)
+parser.add_argument('--ponder', action='store_true', help="let AI players think during their opponent's turn")
+parser.add_argument('--animate', action='store_true', help="show discs falling into place")
 parser.add_argument('--fast', action='store_true', help='flag to speed up the game by not using graphics (AI only)')
 parser.add_argument('--verbose', action='store_true', help="display game details")
-parser.add_argument('--version', action='version', version=utils.get_version())
+parser.add_argument('--version', action=VersionAction)
 
 def main(args):
     if args.verbose:
@@ -39,14 +53,113 @@ def main(args):
     # Play the game
     play(players, **vars(args))
 
-def play(players, rows=6, cols=7, board=None, fast=False, verbose=False, **kwargs):
+def get_engine_move(engine, timeout=TIMEOUT, idle=None):
+    """Ask a class-based AI player (see engine.py) for a move, giving up once the time limit has passed.
+
+    Parameters
+    ----------
+    engine : engine.Engine
+        The AI player, which already knows the state of the game.
+    timeout : float
+        Maximum time allowed for the move, in seconds (None or 0 means no limit).
+    idle : function or None
+        Called over and over while waiting for the AI (see run_with_timeout).
+
+    Returns
+    -------
+    col : int
+        The column (using 1-indexing!) chosen by the AI.
+
+    Raises
+    ------
+    TimeoutError
+        If the AI did not return a move in time. Any error raised by the AI itself is
+        passed on to the caller.
+    """
+    deadline = time.time() + timeout if timeout else None
+    return run_with_timeout(engine.choose_move, timeout, deadline, idle=idle, owner=get_owner(engine))
+
+def get_owner(engine):
+    """Whose state does an AI player change while it thinks (the key used in BUSY)?
+
+    Function-based players keep their search state (tables, counters, etc.) in module
+    globals, so engines wrapping the same module share one owner: the module itself.
+    """
+    return getattr(engine, 'ai', engine)
+
+def is_busy(engine):
+    """Is an earlier call to this AI player that ran out of time still running (see run_with_timeout)?"""
+    busy = BUSY.get(get_owner(engine))
+    return busy is not None and busy.is_alive()
+
+def make_board(rows, cols, board=None, verbose=True):
+    """Create the starting board for a game.
+
+    Parameters
+    ----------
+    rows : int
+        Number of rows on the board.
+    cols : int
+        Number of columns on the board.
+    board : str
+        Filename containing a starting board state (if desired). If provided, the size
+        of the board in the file takes precedence over rows and cols.
+    verbose : bool
+        Print a warning when the board file does not match rows and cols (default=True).
+
+    Returns
+    -------
+    board : utils.Board
+        2D array for the starting state of the board (0=empty, 1=player1, 2=player2).
+    rows : int
+        Number of rows on the board.
+    cols : int
+        Number of columns on the board.
+    """
+    if board:
+        board = utils.Board(utils.load_board(board))
+        if rows != board.shape[0]:
+            if verbose: print(f'WARNING: The specified number of rows does not match the board file provided. Setting rows = {board.shape[0]}.')
+            rows = board.shape[0]
+        if cols != board.shape[1]:
+            if verbose: print(f'WARNING: The specified number of columns does not match the board file provided. Setting columns = {board.shape[1]}.')
+            cols = board.shape[1]
+    else: # use an empty board
+        board = utils.Board(np.zeros((rows, cols), dtype=int))
+    return board, rows, cols
+
+def new_game(players, board):
+    """Tell every AI player (see engine.py) that a game is starting on a board."""
+    for i, engine in enumerate(players['engine']):
+        if engine is not None:
+            engine.new_game(utils.Board(board), i)
+
+def notify_move(players, player, col, board):
+    """Tell the AI players about a disc dropped by a player (0-indexing) in a column (0-indexing).
+
+    The opponent hears about the move. The player itself recorded its own move when it
+    chose it, unless it is a human, or unless its move was not played (col is None), in
+    which case it is resynced with the board instead, and both AI players are told that
+    it lost its turn.
+    """
+    opponent = players['engine'][1 - player]
+    if col is not None and opponent is not None:
+        opponent.opponent_moved(col + 1)
+    if col is None:
+        if players['engine'][player] is not None:
+            players['engine'][player].new_game(utils.Board(board), player)
+        for engine in players['engine']:
+            if engine is not None:
+                engine.passed(player)
+
+def play(players, rows=6, cols=7, board=None, fast=False, timeout=TIMEOUT, ponder=False, animate=False, verbose=False, **kwargs):
     """Play a game of Connect Four.
 
     Parameters
     ----------
     players : dict of lists
-        Dictionary of information for each player. Keys include 'name', 'id', and 'ai'.
-        For AI players, the 'ai' module must contain a get_computer_move function.
+        Dictionary of information for each player. Keys include 'name', 'id', 'ai', and
+        'engine' (see utils.load_players). AI players move through their 'engine'.
     rows : int
         Number of rows on the board (default=6).
     cols : int
@@ -56,7 +169,18 @@ def play(players, rows=6, cols=7, board=None, fast=False, verbose=False, **kwarg
         testing and debugging purposes.
     fast : bool
         Flag that determines whether to show graphics (False) or not (True) (default=False).
-        Only matters if both players are non-human.
+        Only matters if both players are non-human, in which case the game is played by
+        play_headless and no window is ever created.
+    timeout : float
+        Maximum time per AI move, in seconds (default=TIMEOUT). An AI that runs out of
+        time loses its turn. Use None or 0 for no limit.
+    ponder : bool
+        Let each AI player think in the background during the other player's turn, using
+        its engine's ponder method (default=False). Only an AI playing against a human
+        ponders, and never while an earlier move of its own is still running (see is_busy).
+    animate : bool
+        Show discs falling into place (default=False). The animation runs while the next
+        player decides, so it never makes AI players wait.
     verbose : bool
         Print status updates to the terminal (default=False).
 
@@ -71,38 +195,49 @@ def play(players, rows=6, cols=7, board=None, fast=False, verbose=False, **kwarg
     if 'human' in players['name']:
         fast = False
 
+    # Play without any graphics objects at all, if possible
+    if fast:
+        return play_headless(players, rows, cols, board, timeout, verbose)['winner']
+
     # Load board from file (if provided)
-    if board:
-        data = np.loadtxt(board, dtype=str)
-        board = np.array([[int(char) for char in string] for string in data]) # convert data to 2D arrays of ints
-        if rows != board.shape[0]:
-            print(f'WARNING: The specified number of rows does not match the board file provided. Setting rows = {board.shape[0]}.')
-            rows = board.shape[0]
-        if cols != board.shape[1]:
-            print(f'WARNING: The specified number of columns does not match the board file provided. Setting columns = {board.shape[1]}.')
-            cols = board.shape[1]
-        board = np.flipud(board) # flip to accommodate utility functions and position of (0,0) place on board
-    else: # use an empty board
-        board = np.zeros((rows, cols), dtype=int)
-    
+    board, rows, cols = make_board(rows, cols, board)
+
     # Initialize the graphical user interface
-    gui = utils.setup(board)
-    params = gui.items[-1]  # extract the global parameters used to create the GUI
+    gui = utils.setup(board, animate)
+    idle = (lambda: utils.refresh(gui)) if animate else None # keeps discs falling while an AI thinks
 
     # Determine whose turn it is (toggle between 0 and 1)
     current_player = 1 if np.count_nonzero(board == 1) > np.count_nonzero(board == 2) else 0
+    nmoves = np.count_nonzero(board) # running move count, used for tie detection
+    new_game(players, board)
+    pondering = None # (thread, stop event) of the waiting AI while it ponders
 
-    # Play the game
-    gameover = False
+    # Play the game (the starting board is scanned once; after that, only the last move is checked)
+    gameover, winner = utils.is_gameover(board)
+    passes = 0 # turns lost in a row
     while not gameover:
+        if passes >= MAX_PASSES: # neither player is able to move
+            msg = f"No disc played in {passes} turns. Game over!"
+            utils.status(gui, msg)
+            if verbose: print(msg)
+            break
+
         # Store player ID for easier verbose mode
         player_id = players['id'][current_player]
+        last = None # (row, col) of the disc dropped this iteration, if any
+
+        # Let the waiting AI think while a human decides (an AI would need the time itself)
+        waiting = players['engine'][1 - current_player]
+        if ponder and pondering is None and players['name'][current_player] == 'human' \
+                and waiting is not None and not is_busy(waiting):
+            pondering = start_pondering(waiting)
 
         # Ask current player to make a move
         if players['name'][current_player] == 'human':
             utils.status(gui, f"{player_id}, pick a column (1-{cols})...")
+            utils.refresh(gui)
 
-            key = gui.checkKey()
+            key = gui.waitKey(1 / utils.FPS if gui.falling else None) # sleeps until a key is pressed (pondering runs meanwhile)
             if key == "Escape" or key == "Ctrl+e": # exit game
                 break
             elif key == 'd': # debug
@@ -115,9 +250,13 @@ def play(players, rows=6, cols=7, board=None, fast=False, verbose=False, **kwarg
                     print()
                 print()
             elif key == "Ctrl+n": # start new game
+                pondering = stop_pondering(pondering)
                 utils.reset(gui)
-                board = np.zeros((rows, cols))
+                board = utils.Board(np.zeros((rows, cols), dtype=int))
                 current_player = 0
+                nmoves = 0
+                passes = 0
+                new_game(players, board)
             elif key in [str(i + 1) for i in range(cols)]:
                 col = int(key) # index of desired column
                 if verbose: print(f'\t{player_id} selects column {col}')
@@ -125,7 +264,9 @@ def play(players, rows=6, cols=7, board=None, fast=False, verbose=False, **kwarg
                 # Validate the move
                 col = col - 1 # convert to 0-indexing
                 if utils.is_valid(board, col):
-                    utils.drop(gui, board, current_player, col)
+                    last = (utils.drop(gui, board, current_player, col), col)
+                    pondering = stop_pondering(pondering)
+                    notify_move(players, current_player, col, board)
                     current_player = 1 - current_player # switch turns
                 else: # the player must forfeit for illegal moves
                     pass # currently allows human to make illegal moves
@@ -133,28 +274,46 @@ def play(players, rows=6, cols=7, board=None, fast=False, verbose=False, **kwarg
                     # break
         else: # AI player
             utils.status(gui, f"{player_id} is thinking...")
-            if not fast: time.sleep(DELAY)
+            utils.refresh(gui)
+            utils.wait(gui, DELAY)
             try:
-                col = players['ai'][current_player].get_computer_move(deepcopy(board), current_player)
+                col = get_engine_move(players['engine'][current_player], timeout, idle)
                 if verbose: print(f'\t{player_id} selects column {col}')
                 
                 # Validate the move
                 col = col - 1 # convert to 0-indexing
                 if utils.is_valid(board, col):
-                    utils.drop(gui, board, current_player, col)
+                    last = (utils.drop(gui, board, current_player, col), col)
+                    pondering = stop_pondering(pondering)
+                    notify_move(players, current_player, col, board)
                     current_player = 1 - current_player # switch turns
                 else: # the player must forfeit for illegal moves
                     utils.status(gui, f"{player_id} made an illegal move. You forfeit!")
                     break
+            except TimeoutError:
+                utils.status(gui, f"{player_id} loses their turn for taking too long")
+                if verbose: print(f'\t{player_id} ran out of time')
+                pondering = stop_pondering(pondering)
+                notify_move(players, current_player, None, board)
+                current_player = 1 - current_player # you lost your turn!
+                passes += 1
             except:
                 # pdb.set_trace()
                 utils.status(gui, f"{player_id} loses their turn due to code error")
+                pondering = stop_pondering(pondering)
+                notify_move(players, current_player, None, board)
                 current_player = 1 - current_player # you lost your turn!
+                passes += 1
 
         # Check if game is over yet
-        gameover, winner = utils.is_gameover(board)
+        if last is not None:
+            passes = 0
+            nmoves += 1
+            gameover, winner = utils.is_gameover_after(board, *last, nmoves)
+        utils.refresh(gui) # draw everything that changed this turn at once
 
     # Show result
+    utils.land(gui)
     if winner == 0:
         msg = "TIE!"
         utils.status(gui, msg)
@@ -163,15 +322,190 @@ def play(players, rows=6, cols=7, board=None, fast=False, verbose=False, **kwarg
         msg = f"{players['id'][winner - 1].upper()} WINS!"
         utils.status(gui, msg)
         if verbose: print(msg)
+    utils.refresh(gui)
+    stop_pondering(pondering)
+    for engine in players['engine']:
+        if engine is not None:
+            engine.end_game(winner)
 
     # Wait for user to quit
     while True:
-        key = gui.checkKey()
+        key = gui.waitKey()
         if key == "Escape" or key == "Ctrl+e": # exit game
             break
         elif key == 'd': # debug
             pdb.set_trace()
 
+    return winner
+
+def play_headless(players, rows=6, cols=7, board=None, timeout=TIMEOUT, verbose=False):
+    """Play a game of Connect Four between two AI players without any graphics.
+
+    This never creates a window (or even imports the graphics module), so it works on
+    machines without a display and is as fast as the AI players allow.
+
+    Parameters
+    ----------
+    players : dict of lists
+        Dictionary of information for each player (see play). Both players must be AI.
+    rows : int
+        Number of rows on the board (default=6).
+    cols : int
+        Number of columns on the board (default=7).
+    board : str
+        Filename containing a starting board state (if desired).
+    timeout : float
+        Maximum time per AI move, in seconds (default=TIMEOUT). Use None or 0 for no limit.
+    verbose : bool
+        Print status updates to the terminal (default=False).
+
+    Returns
+    -------
+    result : dict
+        Summary of the game. Keys include 'winner' (1=player1, 2=player2, 0=tie,
+        -1=undetermined), 'forfeit' (1-indexed player who made an illegal move, or None),
+        'moves' (list of columns played, 0-indexing), and per-player lists of total thinking
+        time ('time'), number of decisions ('turns'), and turns lost to 'timeouts' and 'errors'.
+    """
+    board, rows, cols = make_board(rows, cols, board, verbose)
+    result = {
+        'winner': -1,
+        'forfeit': None,
+        'moves': [],
+        'time': [0.0, 0.0],
+        'turns': [0, 0],
+        'timeouts': [0, 0],
+        'errors': [0, 0]}
+
+    current_player = 1 if np.count_nonzero(board == 1) > np.count_nonzero(board == 2) else 0
+    nmoves = np.count_nonzero(board)
+    new_game(players, board)
+    gameover, winner = utils.is_gameover(board)
+    passes = 0 # turns lost in a row
+    while not gameover:
+        if passes >= MAX_PASSES: # neither player is able to move
+            if verbose: print(f'No disc played in {passes} turns; stopping the game.')
+            break
+        player_id = players['id'][current_player]
+        start = time.perf_counter()
+        try:
+            col = get_engine_move(players['engine'][current_player], timeout) - 1
+        except TimeoutError:
+            col = None
+            result['timeouts'][current_player] += 1
+            if verbose: print(f'\t{player_id} ran out of time')
+        except Exception:
+            col = None
+            result['errors'][current_player] += 1
+            if verbose: print(f'\t{player_id} loses their turn due to code error')
+        result['time'][current_player] += time.perf_counter() - start
+        result['turns'][current_player] += 1
+
+        if col is not None:
+            if verbose: print(f'\t{player_id} selects column {col + 1}')
+            if not utils.is_valid(board, col): # the player must forfeit for illegal moves
+                result['forfeit'] = current_player + 1
+                if verbose: print(f'{player_id} made an illegal move and forfeits!')
+                break
+            row = utils.drop(None, board, current_player, col)
+            passes = 0
+            result['moves'].append(col)
+            nmoves += 1
+            gameover, winner = utils.is_gameover_after(board, row, col, nmoves)
+        else:
+            passes += 1
+        notify_move(players, current_player, col, board)
+        current_player = 1 - current_player # switch turns (or lose your turn)
+
+    result['winner'] = winner
+    for engine in players['engine']:
+        engine.end_game(winner)
+    if verbose:
+        print("TIE!" if winner == 0 else f"{players['id'][winner - 1].upper()} WINS!" if winner > 0 else "No winner.")
+    return result
+
+def run_with_timeout(func, timeout, *args, idle=None, owner=None, **kwargs):
+    """Call an AI function, giving up once the time limit has passed.
+
+    The function runs in a background thread so that the game loop can stop waiting
+    for it. Python threads cannot be stopped, so if it runs out of time, the thread is
+    left to finish on its own; until it does, the owner (e.g., the AI module, whose
+    globals the thread may still be changing) is not called again. A later call first
+    waits for it, out of its own time limit, and times out if it is still running.
+    Meanwhile, idle (if given) is called about utils.FPS times per second, e.g., to
+    keep the game window moving.
+
+    Raises
+    ------
+    TimeoutError
+        If the function did not return in time. Any error raised by the function itself
+        is passed on to the caller.
+    """
+    end = time.monotonic() + timeout if timeout else float('inf') # not affected by changes to the clock
+    def join(thread):
+        if idle is None:
+            thread.join(None if end == float('inf') else max(0, end - time.monotonic()))
+            return
+        while thread.is_alive() and time.monotonic() < end:
+            idle()
+            thread.join(min(1 / utils.FPS, max(0, end - time.monotonic())))
+
+    # Wait for an earlier call that ran out of time
+    busy = BUSY.get(owner)
+    if busy is not None:
+        join(busy)
+        if busy.is_alive():
+            raise TimeoutError(f"previous move still running after {timeout} seconds")
+        del BUSY[owner]
+
+    if not timeout and idle is None:
+        return func(*args, **kwargs)
+
+    result = {}
+    def think():
+        try:
+            result['value'] = func(*args, **kwargs)
+        except Exception as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=think, daemon=True) # abandoned if it runs out of time
+    thread.start()
+    join(thread)
+    if thread.is_alive():
+        if owner is not None:
+            BUSY[owner] = thread
+        raise TimeoutError(f"no move after {timeout} seconds")
+    if 'error' in result:
+        raise result['error']
+    return result['value']
+
+def start_pondering(engine):
+    """Run an AI player's ponder method in a background thread (see engine.py).
+
+    Returns
+    -------
+    pondering : tuple
+        (thread, stop event), to pass to stop_pondering once the opponent has moved.
+    """
+    stop = threading.Event()
+    def think():
+        try:
+            engine.ponder(stop)
+        except Exception: # pondering is optional, so errors only cost the head start
+            pass
+
+    thread = threading.Thread(target=think, daemon=True)
+    thread.start()
+    return thread, stop
+
+def stop_pondering(pondering):
+    """Stop a background ponder started by start_pondering (if any) and wait for it; returns None."""
+    if pondering is not None:
+        thread, stop = pondering
+        stop.set()
+        thread.join()
+    return None
+
 if __name__ == "__main__":
     args = parser.parse_args()
     utils.check_args(args)
@@ -0,0 +1,186 @@
+# engine.py
+# Class-based protocol for AI players that keep their state between moves.
+#
+# The simplest AI player is a file with a get_computer_move function, which is
+# handed a fresh copy of the board on every turn and has to rebuild any search
+# state (trees, tables, hashes) from scratch. A file may instead define a class
+# named Player (usually a subclass of Engine below). The game then creates one
+# instance per game seat and tells it what happens as the game goes on:
+#
+#     new_game(board, which_player)   a game starts (or the state must be resynced)
+#     opponent_moved(col)             the other player dropped a disc in col
+#     passed(player)                  a player lost their turn (the other one moves next)
+#     choose_move(deadline)           return the column for our next disc
+#     end_game(winner)                the game is over
+#     ponder(stop)                    optional: think during the opponent's turn,
+#                                     until the threading.Event stop is set
+#
+# Columns use 1-indexing, just like get_computer_move. Players take turns, except
+# after a lost turn, so engines should not work out whose turn it is from the
+# number of discs on the board. utils.load_players wraps
+# function-based players in a FunctionPlayer, so the game loop only ever has to
+# deal with this protocol.
+
+import inspect
+import threading
+import time
+import utils
+
+PONDER_SLICE = 0.1 # time for each search while pondering, in seconds (doubles every round)
+PONDER_SLICE_MAX = 0.5 # longest search while pondering (the game waits for it to finish)
+
+
+class Engine:
+    """Base class for class-based AI players.
+
+    Keeps a private copy of the board up to date. Subclasses must implement
+    choose_move, and must record their own move (e.g., with drop) before
+    returning it, since the game only reports the opponent's moves.
+
+    Attributes
+    ----------
+    board : np.array of ints
+        2D array for the current state of the board (0=empty, 1=player1, 2=player2).
+    which_player : int
+        The player index (0-indexing) this engine plays as.
+    generation : int
+        Number of times new_game has been called. A move that finishes after the game
+        has moved on (e.g., it ran out of time and the engine was resynced) must not
+        change the engine's state; compare this before and after, holding lock.
+    lock : threading.Lock
+        Held while the state is replaced (see new_game).
+    """
+
+    def __init__(self):
+        self.board = None
+        self.which_player = None
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def new_game(self, board, which_player):
+        """Start a new game (also called to resync after a move of ours was not played).
+
+        Parameters
+        ----------
+        board : np.array of ints
+            2D array for the starting state of the board; the engine may keep and modify it.
+        which_player : int
+            The player index (0-indexing) this engine plays as.
+        """
+        with self.lock:
+            self.board = board
+            self.which_player = which_player
+            self.generation += 1
+
+    def opponent_moved(self, col):
+        """Record a disc dropped by the opponent in a column (using 1-indexing!)."""
+        self.drop(col - 1, 1 - self.which_player)
+
+    def passed(self, player):
+        """Record that a player (0-indexing) lost their turn, so the other player moves next.
+
+        Both engines are told; the one that lost its turn has just been resynced with
+        new_game. The board does not change, so this does nothing by default.
+        """
+        pass
+
+    def choose_move(self, deadline=None):
+        """Choose the next move.
+
+        Parameters
+        ----------
+        deadline : float or None
+            Time (as returned by time.time()) by which the move must be returned, or None
+            if there is no time limit.
+
+        Returns
+        -------
+        choice : int
+            The column (using 1-indexing!) that the player wants to drop a disc into.
+        """
+        raise NotImplementedError
+
+    def end_game(self, winner):
+        """Finish a game. (1=player1, 2=player2, 0=tie, -1=undetermined)"""
+        pass
+
+    def ponder(self, stop):
+        """Think about the game during the opponent's turn (does nothing by default).
+
+        Runs in a background thread while the opponent decides, and must return soon
+        after stop is set; opponent_moved is only called after it has returned.
+
+        Parameters
+        ----------
+        stop : threading.Event
+            Set when the opponent has moved (or the game ends).
+        """
+        pass
+
+    def drop(self, col, player):
+        """Drop a disc for a player (0-indexing) in a column (0-indexing) on the private board."""
+        return utils.make_move(self.board, player, col)
+
+
+class FunctionPlayer(Engine):
+    """Adapter that lets a get_computer_move function play through the Engine protocol.
+
+    Parameters
+    ----------
+    ai : module
+        The AI player, which must contain a get_computer_move function.
+    """
+
+    def __init__(self, ai):
+        super().__init__()
+        self.ai = ai
+        self.uses_deadline = 'deadline' in inspect.signature(ai.get_computer_move).parameters
+        self.answers = {} # moves found while pondering: board bytes -> [col, time spent]
+
+    def __repr__(self):
+        return f"FunctionPlayer({self.ai.__name__})"
+
+    def choose_move(self, deadline=None):
+        generation = self.generation
+
+        # Answer at once if pondering spent at least as long on this position as we have now
+        answer = self.answers.get(self.board.tobytes())
+        self.answers = {}
+        if answer is not None and deadline is not None and answer[1] >= deadline - time.time():
+            col = answer[0]
+        else:
+            kwargs = {'deadline': deadline} if deadline is not None and self.uses_deadline else {}
+            col = self.ai.get_computer_move(utils.read_only(self.board), self.which_player, **kwargs)
+        with self.lock:
+            if generation == self.generation and utils.is_valid(self.board, col - 1): # not too late
+                self.drop(col - 1, self.which_player)
+        return col
+
+    def ponder(self, stop):
+        """Search our answer to every possible reply of the opponent, until stopped.
+
+        The function can only be stopped by its deadline, so each search is short; every
+        round through the replies (centre first) searches each one for twice as long as
+        the last. Players that keep state between calls (e.g., a transposition table)
+        also benefit when the answer ends up being searched again.
+        """
+        self.answers = {}
+        if not self.uses_deadline:
+            return
+        cols = self.board.shape[1]
+        replies = [col for col in sorted(range(cols), key=lambda col: abs(col - (cols - 1) / 2)) if utils.is_valid(self.board, col)]
+        think = PONDER_SLICE
+        while replies and not stop.is_set():
+            for col in replies:
+                if stop.is_set():
+                    return
+                board = utils.Board(self.board)
+                utils.make_move(board, 1 - self.which_player, col) # the opponent's disc
+                start = time.time()
+                try:
+                    move = self.ai.get_computer_move(utils.read_only(board), self.which_player, deadline=start + think)
+                except Exception: # e.g., the reply ends the game
+                    continue
+                spent = self.answers.get(board.tobytes(), [None, 0.0])[1] + time.time() - start
+                self.answers[board.tobytes()] = [move, spent]
+            think = min(2 * think, PONDER_SLICE_MAX)
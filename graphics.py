@@ -218,7 +218,7 @@ class GraphWin(tk.Canvas):
         self.pack()
         master.resizable(0,0)
         self.foreground = "black"
-        self.items = []
+        self.items = {} # drawn objects, in drawing order (a dict, so delItem is O(1))
         self.mouseX = None
         self.mouseY = None
         self.bind("<Button-1>", self._onClick)
@@ -227,10 +227,13 @@ class GraphWin(tk.Canvas):
         self.width = int(width)
         self.autoflush = autoflush
         self._mouseCallback = None
+        self._keyCallback = None
+        self._event = tk.IntVar(_root, 0) # changed on every key press, click, or close (see waitEvent)
         self.trans = None
         self.closed = False
         master.lift()
         self.lastKey = ""
+        self.keys = [] # key presses that have not been read yet (see waitKey)
         if autoflush: _root.update()
 
     def __repr__(self):
@@ -263,6 +266,10 @@ class GraphWin(tk.Canvas):
             c = 'Ctrl+' + c
 
         self.lastKey = c
+        self.keys.append(c)
+        if self._keyCallback:
+            self._keyCallback(c)
+        self._signal()
 
 
     def setBackground(self, color):
@@ -283,6 +290,7 @@ class GraphWin(tk.Canvas):
         if self.closed: return
         self.closed = True
         self.master.destroy()
+        self._signal() # wake up anyone waiting for input
         self.__autoflush()
 
 
@@ -325,9 +333,8 @@ class GraphWin(tk.Canvas):
         self.mouseX = None
         self.mouseY = None
         while self.mouseX == None or self.mouseY == None:
-            self.update()
             if self.isClosed(): raise GraphicsError("getMouse in closed window")
-            time.sleep(.1) # give up thread
+            self.waitEvent()
         x,y = self.toWorld(self.mouseX, self.mouseY)
         self.mouseX = None
         self.mouseY = None
@@ -350,14 +357,8 @@ class GraphWin(tk.Canvas):
     def getKey(self):
         """Wait for user to press a key and return it as a string."""
         self.lastKey = ""
-        while self.lastKey == "":
-            self.update()
-            if self.isClosed(): raise GraphicsError("getKey in closed window")
-            time.sleep(.1) # give up thread
-
-        key = self.lastKey
-        self.lastKey = ""
-        return key
+        self.keys = []
+        return self.waitKey()
 
     def checkKey(self):
         """Return last key pressed or None if no key pressed since last call"""
@@ -366,8 +367,37 @@ class GraphWin(tk.Canvas):
         self.update()
         key = self.lastKey
         self.lastKey = ""
+        self.keys = []
         return key
 
+    def waitKey(self, timeout=None):
+        """Return the next key press (in order, including any made since the
+        last call) as a string, or "" if timeout seconds pass first.
+        Unlike polling checkKey in a loop, this sleeps until a key is
+        pressed, so waiting for input uses no CPU time."""
+        deadline = None if timeout is None else time.time() + timeout
+        while not self.keys:
+            if self.isClosed(): raise GraphicsError("waitKey in closed window")
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                return ""
+            self.waitEvent(remaining)
+        self.lastKey = ""
+        return self.keys.pop(0)
+
+    def waitEvent(self, timeout=None):
+        """Run the Tk event loop (redrawing the window as needed) until the
+        next key press, mouse click, or close, or until timeout seconds pass."""
+        timer = None
+        if timeout is not None:
+            timer = self.after(max(1, int(1000 * timeout)), self._signal)
+        self.wait_variable(self._event)
+        if timer is not None:
+            self.after_cancel(timer)
+
+    def _signal(self):
+        self._event.set(self._event.get() + 1)
+
     def getHeight(self):
         """Return the height of the window"""
         return self.height
@@ -393,22 +423,30 @@ class GraphWin(tk.Canvas):
     def setMouseHandler(self, func):
         self._mouseCallback = func
 
+    def setKeyHandler(self, func):
+        """Call func with the name of every key pressed (see _onKey)."""
+        self._keyCallback = func
+
     def _onClick(self, e):
         self.mouseX = e.x
         self.mouseY = e.y
         if self._mouseCallback:
             self._mouseCallback(Point(e.x, e.y))
+        self._signal()
 
     def addItem(self, item):
-        self.items.append(item)
+        self.items[item] = None
 
     def delItem(self, item):
-        self.items.remove(item)
+        self.items.pop(item, None)
 
     def redraw(self):
-        for item in self.items[:]:
+        # Flush once at the end, rather than after every item
+        autoflush, self.autoflush = self.autoflush, False
+        for item in list(self.items):
             item.undraw()
             item.draw(self)
+        self.autoflush = autoflush
         self.update()
 
 
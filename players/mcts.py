@@ -0,0 +1,270 @@
+# mcts.py
+# Connect Four AI player that uses Monte Carlo Tree Search (MCTS).
+#
+# Instead of scoring positions with a hand-written evaluation, the player
+# plays many random games (rollouts) from each position it considers, and
+# focuses on the moves that win most often (UCT selection). Rollouts are run
+# in batches, all at once with NumPy, and the search tree is kept between
+# moves (by the Player class, see engine.py), so the player gets stronger the
+# more time it is given. Because it needs no evaluation function, it also
+# copes with large custom boards.
+
+import math
+import numpy as np
+import pdb
+import random
+import time
+import utils
+from bitboard import Bitboard
+from engine import PONDER_SLICE, Engine
+
+ITERATIONS = 200  # tree iterations when the game loop does not provide a deadline
+BATCH = 32  # rollouts per iteration, played at the same time
+EXPLORATION = 1.4  # weight of the exploration term in the UCT formula
+MARGIN = 0.05  # time reserved for returning the move before the deadline, in seconds
+
+ROOT = None  # search tree after our last move, reused on the next move (get_computer_move only)
+ROOT_BOARD = None  # Bitboard for the position at ROOT
+
+
+class Node:
+    """One position in the search tree.
+
+    Parameters
+    ----------
+    move : int or None
+        The column (0-indexing) played to reach this position (None at the root).
+    player : int
+        The player (using 1-indexing!) who made that move.
+    parent : Node or None
+        The position before the move.
+    moves : list of ints
+        The valid moves in this position, which have not been expanded yet.
+    terminal : int or None
+        Who won, if the game is over in this position (same as utils.is_gameover).
+    """
+    __slots__ = ('move', 'player', 'parent', 'children', 'untried', 'visits', 'wins', 'terminal')
+
+    def __init__(self, move, player, parent=None, moves=(), terminal=None):
+        self.move = move
+        self.player = player
+        self.parent = parent
+        self.children = {}
+        self.untried = list(moves)
+        random.shuffle(self.untried)
+        self.visits = 0
+        self.wins = 0.0 # rollouts won by player (draws count as half)
+        self.terminal = terminal
+
+    def select(self):
+        """Pick the child with the highest upper confidence bound (UCT)."""
+        scale = EXPLORATION * math.sqrt(math.log(self.visits))
+        return max(self.children.values(),
+                   key=lambda child: child.wins / child.visits + scale / math.sqrt(child.visits))
+
+
+class Player(Engine):
+    """MCTS player that follows the game move by move, keeping its tree throughout."""
+
+    def new_game(self, board, which_player):
+        super().new_game(board, which_player)
+        self.position = Bitboard.from_array(board)
+        self.root = Node(None, 2 - self.position.turn, moves=self.position.get_valid_moves())
+
+    def opponent_moved(self, col):
+        super().opponent_moved(col)
+        self.set_turn(1 - self.which_player)
+        self.advance(col - 1)
+
+    def passed(self, player):
+        self.set_turn(1 - player)
+
+    def choose_move(self, deadline=None):
+        generation = self.generation
+        self.set_turn(self.which_player)
+        iterations = search(self.root, self.position, deadline)
+        if self.root.children:
+            choice = max(self.root.children.values(), key=lambda child: child.visits).move
+        else: # not even one iteration finished
+            choice = random.choice(self.position.get_valid_moves())
+        print(f"Chosen move: {choice + 1} ({iterations} iterations, {self.root.visits} rollouts)")
+        with self.lock:
+            if generation == self.generation: # otherwise, the game has been resynced (see Engine)
+                self.drop(choice, self.which_player)
+                self.advance(choice)
+        return choice + 1
+
+    def ponder(self, stop):
+        # Keep growing the tree during the opponent's turn; opponent_moved then keeps the
+        # subtree below the reply that was actually played
+        while not stop.is_set() and self.root.terminal is None:
+            search(self.root, self.position, time.time() + MARGIN + PONDER_SLICE)
+
+    def set_turn(self, player):
+        """Make it a player's (0-indexing) turn, which is not always the one the disc counts
+        suggest (e.g., after a lost turn); the tree is started over if it was for the other player."""
+        if self.position.turn != player:
+            self.position.turn = player
+            self.root = Node(None, 2 - player, moves=self.position.get_valid_moves())
+
+    def advance(self, col):
+        """Move the root of the tree down to the child for a move (0-indexing)."""
+        player = self.position.turn + 1
+        self.position.play(col)
+        self.root = self.root.children.get(col)
+        if self.root is None:
+            moves = self.position.get_valid_moves()
+            self.root = Node(col, player, moves=moves)
+        self.root.parent = None
+
+
+def get_computer_move(board, which_player, deadline=None):
+    """Search for the best move with Monte Carlo Tree Search.
+
+    Parameters
+    ----------
+    board : np.array of ints
+        2D array for the current state of the board (0=empty, 1=player1, 2=player2).
+    which_player : int
+        The AI player may want to know which player [1, 2] they are!
+    deadline : float or None
+        Time (as returned by time.time()) by which the move must be returned. If provided,
+        the search runs until time runs out; otherwise, it runs ITERATIONS iterations.
+
+    Returns
+    -------
+    choice : int
+        The column (using 1-indexing!) that the player wants to drop a disc into.
+    """
+    global ROOT, ROOT_BOARD
+    bb = Bitboard.from_array(board)
+    bb.turn = which_player
+    root = find_root(bb)
+    iterations = search(root, bb, deadline)
+
+    if root.children:
+        choice = max(root.children.values(), key=lambda child: child.visits).move
+    else: # not even one iteration finished
+        choice = random.choice(bb.get_valid_moves())
+    print(f"Chosen move: {choice + 1} ({iterations} iterations, {root.visits} rollouts)")
+
+    # Keep the subtree below our move for the next search
+    ROOT = root.children.get(choice)
+    if ROOT is not None:
+        ROOT.parent = None
+        ROOT_BOARD = bb.copy()
+        ROOT_BOARD.play(choice)
+    return choice + 1
+
+
+def find_root(bb):
+    """Reuse the subtree for the current position, if the last search reached it.
+
+    The opponent has made one move since our last search, so the current position
+    is one of the children of the position after our move.
+    """
+    if ROOT is not None and (ROOT_BOARD.rows, ROOT_BOARD.cols) == (bb.rows, bb.cols):
+        key = bb.key()
+        for col, child in ROOT.children.items():
+            after = ROOT_BOARD.copy()
+            after.play(col)
+            if after.key() == key and after.turn == bb.turn:
+                child.parent = None
+                return child
+    return Node(None, 2 - bb.turn, moves=bb.get_valid_moves())
+
+
+def search(root, bb, deadline=None):
+    """Grow the search tree below the root until time (or the iteration budget) runs out.
+
+    Returns
+    -------
+    iterations : int
+        Number of iterations (selection, expansion, rollouts, backpropagation) completed.
+    """
+    iterations = 0
+    stop = None if deadline is None else deadline - MARGIN
+    while (iterations < ITERATIONS) if stop is None else (time.time() < stop):
+        node = root
+        position = bb.copy()
+
+        # Select: descend through fully expanded nodes
+        while not node.untried and node.children and node.terminal is None:
+            node = node.select()
+            position.play(node.move)
+
+        # Expand: add one new child
+        if node.untried and node.terminal is None:
+            move = node.untried.pop()
+            player = position.turn + 1
+            terminal = player if position.is_winning_move(move) else None
+            position.play(move)
+            moves = position.get_valid_moves() if terminal is None else ()
+            if terminal is None and not moves:
+                terminal = 0 # the board is full
+            node.children[move] = Node(move, player, node, moves, terminal)
+            node = node.children[move]
+
+        # Simulate: random games from the new position (or the known result)
+        if node.terminal is not None:
+            winners = np.full(BATCH, node.terminal)
+        else:
+            winners = rollout(position.to_array(), position.turn + 1, BATCH)
+
+        # Backpropagate
+        wins = {1: np.count_nonzero(winners == 1), 2: np.count_nonzero(winners == 2)}
+        draws = len(winners) - wins[1] - wins[2]
+        while node is not None:
+            node.visits += len(winners)
+            node.wins += wins[node.player] + draws / 2
+            node = node.parent
+        iterations += 1
+    return iterations
+
+
+def rollout(board, player, n):
+    """Play n random games from the same position at once.
+
+    Each step drops one disc on every unfinished board, then checks only the windows
+    through the new discs (see utils.get_cell_windows) for four in a row.
+
+    Parameters
+    ----------
+    board : np.array of ints
+        2D array for the starting position (0=empty, 1=player1, 2=player2).
+    player : int
+        The player to move (using 1-indexing!).
+    n : int
+        Number of games to play.
+
+    Returns
+    -------
+    winners : np.array of ints
+        Who won each game? (1=player1, 2=player2, 0=tie)
+    """
+    rows, cols = board.shape
+    windows = utils.get_windows(rows, cols)
+    cell_windows = utils.get_cell_windows(rows, cols)
+
+    boards = np.tile(board.ravel(), (n, 1))
+    heights = np.tile(np.count_nonzero(board, axis=0), (n, 1))
+    winners = np.zeros(n, dtype=int)
+    active = np.arange(n)
+    while active.size:
+        # Pick a random open column on every board (full boards are ties)
+        open_cols = heights[active] < rows
+        active, open_cols = active[open_cols.any(axis=1)], open_cols[open_cols.any(axis=1)]
+        if not active.size:
+            break
+        col = np.where(open_cols, np.random.random(open_cols.shape), -1).argmax(axis=1)
+        cell = heights[active, col] * cols + col
+        boards[active, cell] = player
+        heights[active, col] += 1
+
+        # Check the windows through the new discs
+        indices = cell_windows[cell]
+        won = ((boards[active[:, None, None], windows[indices]] == player).all(axis=2) & (indices >= 0)).any(axis=1)
+        winners[active[won]] = player
+        active = active[~won]
+        player = 3 - player
+    return winners
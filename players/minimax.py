@@ -1,11 +1,47 @@
+import atexit
+from concurrent.futures import ProcessPoolExecutor, wait
+import multiprocessing
 import numpy as np
+import os
 import pdb
+import site
+import time
 import utils
 import random
+from bitboard import Bitboard
+from book import Book
+from solver import Solver, SolverTimeout
+from transposition import EXACT, LOWER, UPPER, TranspositionTable, Zobrist
 
 STUPID_GLOBAL = -1
+DEPTH = 4  # search depth when the game loop does not provide a deadline
+MARGIN = 0.05  # time reserved for returning the move before the deadline, in seconds
+TT_MEMORY = 64 * 2**20  # memory budget for the transposition table, in bytes
+SOLVER_THRESHOLD = 18  # play perfectly once this many empty cells (or fewer) remain
+ORDERING = ("hash", "killer", "history", "centre")  # move ordering heuristics, most important first
+PROCESSES = 1  # number of processes that split the root moves between them (1 = search in this process only)
+USE_BOOK = True  # play from the opening book, if there is one for the board size (see book.py)
+BOOK_FILE = os.path.join(utils.ROOT, "books", "minimax-{rows}x{cols}.book")
 
-def get_computer_move(board: np.ndarray, which_player: int):
+TABLE = TranspositionTable(TT_MEMORY)
+ZOBRIST = None
+SOLVER = None
+POOL = None  # worker processes for the parallel search (see parallel_search)
+BOOKS = {}  # opening books, keyed by board shape (None if there is no book)
+NODES = 0  # number of positions searched for the current move
+KILLERS = {}  # moves that recently caused a cutoff, keyed by ply (distance from the root)
+HISTORY = {}  # how often each (player, move) caused a cutoff, weighted by depth
+WINDOWS = {}  # transposed window tables, keyed by board shape (see get_windows)
+
+WINDOW_POWERS = np.array([1, 3, 9, 27])  # window code = sum of cell value * 3**position
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the deadline for the current move has passed."""
+    pass
+
+
+def get_computer_move(board: np.ndarray, which_player: int, deadline=None):
     global STUPID_GLOBAL
     """Search for the best move based on the current game state.
     Parameters
@@ -15,91 +51,336 @@ def get_computer_move(board: np.ndarray, which_player: int):
     (0=empty, 1=player1, 2=player2).
     which_player : int
     The AI player may want to know which player [1, 2] they are!
+    deadline : float or None
+    Time (as returned by time.time()) by which the move must be returned.
+    If provided, the search deepens iteratively until time runs out;
+    otherwise, it searches to a fixed depth (DEPTH).
     Returns
     -------
     choice : int
     The column (using 1-indexing!) that the player wants to drop a disc into.
     """
-    STUPID_GLOBAL = which_player
-    best_move, _ = minimax(
-        board, which_player + 1, depth=4, alpha=float("-inf"), beta=float("inf")
-    )
-    print(f"Chosen move: {_}")
+    choice = book_move(board, which_player)
+    if choice is not None:
+        return choice + 1
+
+    choice = solve_endgame(board, which_player, deadline)
+    if choice is not None:
+        return choice + 1
+
+    board = utils.Board(board)  # the search makes and unmakes moves on this one copy
+    if PROCESSES > 1:
+        best_move, _ = parallel_search(board, which_player, deadline)
+    else:
+        keys = reset_table(board, which_player)
+        reset_ordering()
+        STUPID_GLOBAL = which_player
+        best_move, _ = iterative_deepening(board, which_player + 1, keys, deadline)
+    print(f"Chosen move: {_} ({NODES} nodes)")
     return best_move + 1
 
 
-def minimax(board, player, depth, alpha, beta):
+def book_move(board, which_player):
+    """Look up the current position in the opening book, with which_player (0-indexing) to move.
+
+    Returns
+    -------
+    choice : int or None
+        The column (0-indexing) to play, or None if the position is not in the book.
+    """
+    if not USE_BOOK:
+        return None
+    if board.shape not in BOOKS:
+        filename = BOOK_FILE.format(rows=board.shape[0], cols=board.shape[1])
+        BOOKS[board.shape] = Book(filename) if os.path.exists(filename) else None
+    book = BOOKS[board.shape]
+    choice = book.lookup(board, which_player) if book is not None else None
+    if choice is not None:
+        print(f"Book move: {choice + 1}")
+    return choice
+
+
+def solve_endgame(board, which_player, deadline=None):
+    """Find the perfect move with the exact solver, once few enough empty cells remain.
+
+    The solver gets up to half of the remaining time, so that the heuristic search
+    still has time to run if the position cannot be solved. It solves for which_player
+    (0-indexing), who is not always the one the disc counts suggest (e.g., after the
+    other player lost a turn).
+
+    Returns
+    -------
+    choice : int or None
+        The column (0-indexing) to play, or None if the position is not solved.
+    """
+    global SOLVER
+    empty = np.count_nonzero(board == 0)
+    if empty > SOLVER_THRESHOLD:
+        return None
+    if SOLVER is None or (SOLVER.rows, SOLVER.cols) != board.shape:
+        SOLVER = Solver(*board.shape)
+
+    bb = Bitboard.from_array(board)
+    bb.turn = which_player
+    budget = None if deadline is None else time.time() + (deadline - time.time()) / 2
+    try:
+        choice, score = SOLVER.best_move(bb, budget)
+    except SolverTimeout:
+        return None
+    result, distance = SOLVER.outcome(score, bb.nmoves)
+    print(f"Solved: {result}" + (f" in {distance} moves" if distance else ""))
+    return choice
+
+
+def iterative_deepening(board, player, keys, deadline=None):
+    """Search to increasing depths, keeping the result of the last completed depth."""
+    if deadline is None:
+        return minimax(board, player, DEPTH, float("-inf"), float("inf"), keys)
+
+    # Fall back to a random move in case not even the shallowest search finishes
+    best_move, value = random.choice(utils.get_valid_moves(board)), None
+    stop = deadline - MARGIN
+    for depth in range(1, np.count_nonzero(board == 0) + 1):
+        try:
+            move, score = minimax(board, player, depth, float("-inf"), float("inf"), keys, stop)
+        except SearchTimeout:
+            break
+        if move is not None:
+            best_move, value = move, score
+    return best_move, value
+
+
+def parallel_search(board, which_player, deadline=None):
+    """Split the root moves between PROCESSES worker processes (root splitting).
+
+    Each worker runs iterative deepening over its share of the moves, with its own
+    transposition table, and reports its best move at every depth it completes. The
+    result is the best move at the deepest depth that every worker completed, which
+    is the same move a single process would find at that depth.
+    """
+    global POOL, NODES
+    if POOL is None:
+        # Workers are started fresh (the game calls us from a thread, so forking is unsafe),
+        # and unpickle search_moves by module name, so put this folder on their path
+        POOL = ProcessPoolExecutor(PROCESSES, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=site.addsitedir,
+                                   initargs=(os.path.dirname(os.path.abspath(__file__)),))
+        atexit.register(POOL.shutdown, cancel_futures=True)
+
+    # Deal the moves out centre-first, so that every worker gets some promising ones
+    moves = order_moves(list(utils.get_valid_moves(board)), which_player + 1, 0, board.shape[1])
+    shares = [moves[i::PROCESSES] for i in range(min(PROCESSES, len(moves)))]
+    # Workers stop MARGIN before we do, and we stop MARGIN before the deadline, which
+    # leaves time to collect their results (and to use them even if some are late)
+    stop = None if deadline is None else deadline - MARGIN
+    futures = [POOL.submit(search_moves, board, which_player, share, stop) for share in shares]
+    done, late = wait(futures, None if stop is None else max(0, stop - time.time()))
+    for future in late: # searches that have not started yet are dropped; running ones stop at their deadline
+        future.cancel()
+    results = [future.result() for future in futures if future in done]
+    NODES = sum(nodes for _, nodes in results)
+
+    # Fall back to a random move in case not even the shallowest search finished
+    best_move, value = random.choice(moves), None
+    completed = [set(depths) for depths, _ in results]
+    if completed and set.intersection(*completed):
+        depth = max(set.intersection(*completed))
+        candidates = [depths[depth] for depths, _ in results if depths[depth][0] is not None]
+        pick = max if which_player == 0 else min  # player 1 maximizes (see minimax)
+        if candidates:
+            best_move, value = pick(candidates, key=lambda candidate: candidate[1])
+    return best_move, value
+
+
+def search_moves(board, which_player, moves, deadline=None):
+    """Run iterative deepening over some of the root moves (in a worker process).
+
+    Returns
+    -------
+    depths : dict
+        The best (move, value) among the moves for every depth that was completed.
+    nodes : int
+        Number of positions searched.
+    """
+    global STUPID_GLOBAL
+    keys = reset_table(board, which_player)
+    reset_ordering()
+    STUPID_GLOBAL = which_player
+    depths = {}
+    stop = None if deadline is None else deadline - MARGIN
+    for depth in [DEPTH] if deadline is None else range(1, np.count_nonzero(board == 0) + 1):
+        try:
+            depths[depth] = minimax(board, which_player + 1, depth, float("-inf"), float("inf"), keys, stop,
+                                    root_moves=moves)
+        except SearchTimeout:
+            break
+    return depths, NODES
+
+
+def reset_table(board, which_player):
+    """Prepare the transposition table for a search and return the root keys.
+
+    Stored values depend on which side the AI plays (see cost), so the
+    table is cleared whenever that or the board size changes. The keys are
+    those of the board and of its mirror image (see get_keys).
+    """
+    global ZOBRIST
+    if ZOBRIST is None or ZOBRIST.shape != board.shape or STUPID_GLOBAL != which_player:
+        ZOBRIST = Zobrist(*board.shape)
+        TABLE.clear()
+    TABLE.new_search()
+    return ZOBRIST.hash(board, which_player + 1), ZOBRIST.hash(board[:, ::-1], which_player + 1)
+
+
+def reset_ordering():
+    """Reset the node counter and the move ordering statistics before a new move."""
+    global NODES
+    NODES = 0
+    KILLERS.clear()
+    for move in HISTORY: # older statistics still help, but count for less
+        HISTORY[move] //= 2
+
+
+def order_moves(valid_moves, player, ply, cols, hash_move=None):
+    """Sort the valid moves so that the ones most likely to be best are searched first.
+
+    Alpha-beta pruning cuts off far more of the tree when good moves come first. The
+    heuristics listed in ORDERING are applied in priority order: the best move stored in
+    the transposition table ("hash", e.g., from the previous iteration), killer moves
+    that caused a cutoff elsewhere at the same ply ("killer"), moves that have caused
+    many cutoffs so far ("history"), and columns closest to the centre ("centre").
+    """
+    killers = KILLERS.get(ply, ())
+    centre = (cols - 1) / 2
+
+    def priority(move):
+        keys = []
+        for heuristic in ORDERING:
+            if heuristic == "hash":
+                keys.append(move == hash_move)
+            elif heuristic == "killer":
+                keys.append(move in killers)
+            elif heuristic == "history":
+                keys.append(HISTORY.get((player, move), 0))
+            elif heuristic == "centre":
+                keys.append(-abs(move - centre))
+        return keys
+
+    return sorted(valid_moves, key=priority, reverse=True)
+
+
+def record_cutoff(move, player, ply, depth):
+    """Remember a move that caused a cutoff, for the killer and history heuristics."""
+    killers = KILLERS.setdefault(ply, [])
+    if move not in killers:
+        killers.insert(0, move)
+        del killers[2:]  # keep the two most recent killers
+    HISTORY[(player, move)] = HISTORY.get((player, move), 0) + depth * depth
+
+
+def get_keys(keys, row, move, player, cols):
+    """Update the Zobrist keys of a board and its mirror image after a move.
+
+    Mirror-image positions have the same value (the windows scored by cost are
+    symmetric), so the transposition table stores both under the smaller key and
+    translates the best move with utils.mirror_move.
+    """
+    return (ZOBRIST.toggle(keys[0], row, move, player),
+            ZOBRIST.toggle(keys[1], row, cols - 1 - move, player))
+
+
+def minimax(board, player, depth, alpha, beta, keys=None, deadline=None, ply=0, root_moves=None):
+    global NODES
+    NODES += 1
+    if deadline is not None and time.time() > deadline:
+        raise SearchTimeout
+    if keys is None:
+        keys = ZOBRIST.hash(board, player), ZOBRIST.hash(board[:, ::-1], player)
+    cols = board.shape[1]
+    key, mirrored = min(keys), keys[1] < keys[0]
+
+    # Reuse the result from an earlier visit to this position (or its mirror image), if it was searched deep enough
+    entry = TABLE.probe(key)
+    hash_move = utils.mirror_move(entry[3], cols, mirrored) if entry is not None else None
+    if entry is not None and entry[0] >= depth and root_moves is None:
+        _, flag, value, _ = entry
+        move = hash_move
+        if flag == EXACT:
+            return move, value
+        if flag == LOWER:
+            alpha = max(alpha, value)
+        else:
+            beta = min(beta, value)
+        if alpha >= beta:
+            return move, value
+
     # If the depth is 0 or the game is over, return
     if depth == 0 or utils.is_gameover(board)[0]:
-        return None, cost(board, player)
+        value = cost(board, player)
+        TABLE.store(key, depth, EXACT, value, None)
+        return None, value
 
-    # Find the possible valid moves
-    valid_moves = utils.get_valid_moves(board)
+    # Find the possible valid moves, most promising first
+    valid_moves = utils.get_valid_moves(board) if root_moves is None else root_moves
+    if ORDERING:
+        valid_moves = order_moves(valid_moves, player, ply, cols, hash_move)
 
+    alpha0, beta0 = alpha, beta
     if player == 1:
         value = float("-inf")
         best_move = None
         for move in valid_moves:
-            new_board = simulate_move(board, move, player)
-            _, eval = minimax(new_board, 3 - player, depth - 1, alpha, beta)
+            row = utils.make_move(board, player - 1, move)
+            try:
+                _, eval = minimax(board, 3 - player, depth - 1, alpha, beta,
+                                  get_keys(keys, row, move, player, cols), deadline, ply + 1)
+            finally:
+                utils.undo_move(board, move)
             if eval > value:
                 value = eval
                 best_move = move
-            if value > beta:
+            if value >= beta:
+                record_cutoff(move, player, ply, depth)
                 break
             alpha = max(alpha, value)
-        return best_move, value
     else:
         value = float("inf")
         best_move = None
         for move in valid_moves:
-            new_board = simulate_move(board, move, player)
-            _, eval = minimax(new_board, 3 - player, depth - 1, alpha, beta)
+            row = utils.make_move(board, player - 1, move)
+            try:
+                _, eval = minimax(board, 3 - player, depth - 1, alpha, beta,
+                                  get_keys(keys, row, move, player, cols), deadline, ply + 1)
+            finally:
+                utils.undo_move(board, move)
             if eval < value:
                 value = eval
                 best_move = move
-            if value < alpha:
+            if value <= alpha:
+                record_cutoff(move, player, ply, depth)
                 break
             beta = min(beta, value)
-        return best_move, value
+
+    if value <= alpha0:
+        flag = UPPER
+    elif value >= beta0:
+        flag = LOWER
+    else:
+        flag = EXACT
+    if root_moves is None:  # results for only some of the moves are not valid for the position
+        TABLE.store(key, depth, flag, value, utils.mirror_move(best_move, cols, mirrored))
+    return best_move, value
 
 
 def cost(board, player):
-    row_value = 0
-    for row in range(board.shape[0]):
-        for col in range(board.shape[1] - 3):
-            row_value += evaluate_window(board[row][col : col + 4], player)
-    col_value = 0
-    for col in range(board.shape[1]):
-        for row in range(board.shape[0] - 3):
-            col_value += evaluate_window(board[:, col][row : row + 4], player)
-
-    # Some stackoverflow witch craft comment code
-    # https://stackoverflow.com/a/6313414
-    diags = [board[::-1,:].diagonal(i) for i in range(-board.shape[0]+1,board.shape[1])]
-    diags.extend(board.diagonal(i) for i in range(board.shape[1]-1,-board.shape[0],-1))
-    diags = [n.tolist() for n in diags]
-
-    diag_value = 0
-    for val in diags:
-        if len(val) == 4:
-            diag_value += evaluate_window(val, player)
-        elif len(val) > 4:
-            for i in range(len(val)-3):
-                diag_value += evaluate_window(val[i:i+4], player)
-    return row_value + col_value + diag_value
-
-
-def evaluate_window(window, player):
-    window = np.array(window)
-    opponent = 3 - player
-
-    if STUPID_GLOBAL == 0:
-        our_count = np.count_nonzero(window == player)
-        their_count = np.count_nonzero(window == opponent)
-    else:
-        our_count = np.count_nonzero(window == opponent)
-        their_count = np.count_nonzero(window == player)
+    # Encode the contents of every window of four cells as a base-3 number, then look up
+    # the score of each window in a table (see get_window_scores)
+    ours = player if STUPID_GLOBAL == 0 else 3 - player
+    codes = WINDOW_POWERS @ np.asarray(board).take(get_windows(board.shape))
+    return float(WINDOW_SCORES[ours].take(codes).sum())
+
+
+def score_window(our_count, their_count):
     if our_count == 4:
         return 1e10
     if their_count == 4:
@@ -113,8 +394,21 @@ def evaluate_window(window, player):
     return 0
 
 
-# Works as intended
-def simulate_move(board, move, player):
-    new_board = board.copy()
-    new_board[np.argmin(board[:, move])][move] = player
-    return new_board
+def get_window_scores(ours):
+    """Score of every possible window of four cells, indexed by its base-3 code."""
+    scores = np.zeros(81)
+    for code in range(81):
+        cells = [code // 3**k % 3 for k in range(4)]
+        scores[code] = score_window(cells.count(ours), cells.count(3 - ours))
+    return scores
+
+
+def get_windows(shape):
+    """Window table from utils.get_windows, transposed to (4, number of windows) so
+    that each row holds one position within the windows (faster to combine)."""
+    if shape not in WINDOWS:
+        WINDOWS[shape] = np.ascontiguousarray(utils.get_windows(*shape).T)
+    return WINDOWS[shape]
+
+
+WINDOW_SCORES = {ours: get_window_scores(ours) for ours in (1, 2)}  # keyed by our player
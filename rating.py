@@ -0,0 +1,146 @@
+# rating.py
+# Elo ratings, confidence intervals, and sequential testing for match results.
+#
+# Ratings are fit with the Bradley-Terry model (the statistical model behind
+# Elo), so every game counts equally no matter when it was played. The
+# sequential probability ratio test (SPRT) decides, after each game, whether
+# a match has produced enough evidence to stop early.
+
+import math
+from statistics import NormalDist
+import numpy as np
+
+ELO = 400 / math.log(10) # converts natural-log rating units to Elo points
+
+def expected_score(elo):
+    """Convert an Elo difference into an expected score (0 to 1)."""
+    return 1 / (1 + 10 ** (-elo / 400))
+
+def sprt(wins, losses, draws, elo0=0, elo1=10, alpha=0.05, beta=0.05):
+    """Sequential probability ratio test for a match between two players.
+
+    Tests the hypothesis H0 (the Elo difference is elo0) against H1 (it is elo1),
+    using the normal approximation to the log-likelihood ratio (LLR) of the results.
+    Call it after every game and stop the match as soon as a decision is made.
+
+    Parameters
+    ----------
+    wins : int
+        Number of games won by the player being tested.
+    losses : int
+        Number of games lost by the player being tested.
+    draws : int
+        Number of drawn games.
+    elo0 : float
+        Elo difference under the null hypothesis (default=0).
+    elo1 : float
+        Elo difference under the alternative hypothesis (default=10).
+    alpha : float
+        Maximum probability of accepting H1 when H0 is true (default=0.05).
+    beta : float
+        Maximum probability of accepting H0 when H1 is true (default=0.05).
+
+    Returns
+    -------
+    llr : float
+        Log-likelihood ratio of H1 versus H0.
+    decision : str or None
+        'H1' if the player is significantly stronger, 'H0' if not, or None to keep playing.
+    """
+    n = wins + losses + draws
+    lower = math.log(beta / (1 - alpha))
+    upper = math.log((1 - beta) / alpha)
+    if n == 0:
+        return 0.0, None
+
+    # Count one extra (virtual) win and loss, so that the variance is never 0, even when
+    # every game so far had the same result (e.g., one player won them all)
+    wins, losses, n = wins + 1, losses + 1, n + 2
+    score = (wins + draws / 2) / n
+    variance = (wins + draws / 4) / n - score ** 2
+    s0, s1 = expected_score(elo0), expected_score(elo1)
+    llr = (s1 - s0) * (2 * score - s0 - s1) / (2 * variance / n)
+
+    if llr >= upper:
+        return llr, 'H1'
+    if llr <= lower:
+        return llr, 'H0'
+    return llr, None
+
+class Ratings:
+    """Results between named players, with Bradley-Terry (Elo) ratings fit on demand.
+
+    Parameters
+    ----------
+    names : list of str
+        Names of the players (e.g., the 'name' entries from utils.load_players).
+    prior : float
+        Number of virtual drawn games added between every pair of players that has
+        played, so that unbeaten or winless players get finite ratings (default=1).
+    """
+
+    def __init__(self, names, prior=1.0):
+        self.names = list(names)
+        self.prior = prior
+        n = len(self.names)
+        self.points = np.zeros((n, n)) # points[i, j] = points scored by i against j
+        self.games = np.zeros((n, n)) # games[i, j] = games played between i and j
+
+    def add(self, first, second, winner):
+        """Record one game between two players.
+
+        Parameters
+        ----------
+        first : int or str
+            Index or name of the player who went first.
+        second : int or str
+            Index or name of the player who went second.
+        winner : int
+            Who won the game? (1=first, 2=second, 0=tie)
+        """
+        i = first if isinstance(first, (int, np.integer)) else self.names.index(first)
+        j = second if isinstance(second, (int, np.integer)) else self.names.index(second)
+        score = 1.0 if winner == 1 else 0.0 if winner == 2 else 0.5
+        self.points[i, j] += score
+        self.points[j, i] += 1 - score
+        self.games[i, j] += 1
+        self.games[j, i] += 1
+
+    def fit(self, iterations=10000, tol=1e-10):
+        """Fit the ratings by maximum likelihood.
+
+        Returns
+        -------
+        elo : np.array of floats
+            Rating of each player, in Elo points, relative to the average player.
+        error : np.array of floats
+            Approximate standard error of each rating, in Elo points.
+        """
+        played = self.games > 0
+        games = self.games + self.prior * played
+        points = self.points + self.prior / 2 * played
+        wins = points.sum(axis=1)
+
+        # Minorization-maximization updates for the Bradley-Terry strengths
+        gamma = np.ones(len(self.names))
+        for _ in range(iterations):
+            denom = (games / (gamma[:, None] + gamma[None, :])).sum(axis=1)
+            new = np.where(denom > 0, wins / np.where(denom > 0, denom, 1), gamma)
+            new /= np.exp(np.mean(np.log(new)))
+            if np.max(np.abs(new - gamma)) < tol:
+                gamma = new
+                break
+            gamma = new
+
+        # Standard errors from the diagonal of the Fisher information
+        p = gamma[:, None] / (gamma[:, None] + gamma[None, :])
+        information = (games * p * (1 - p)).sum(axis=1)
+        error = np.where(information > 0, 1 / np.sqrt(np.where(information > 0, information, 1)), np.inf)
+        return ELO * np.log(gamma), ELO * error
+
+    def table(self, confidence=0.95):
+        """List (name, elo, margin, games) for every player, strongest first."""
+        elo, error = self.fit()
+        z = NormalDist().inv_cdf((1 + confidence) / 2)
+        rows = [(name, elo[i], z * error[i], int(self.games[i].sum())) for i, name in enumerate(self.names)]
+        return sorted(rows, key=lambda row: row[1], reverse=True)
@@ -0,0 +1,135 @@
+# registry.py
+# Find AI players, and import each one only when it is first needed.
+#
+# The registry lists the files in the players folder without importing any
+# of them, so starting a tournament with dozens of AI players costs nothing
+# until a game actually uses one. Each player is imported from its file the
+# first time it is loaded (its folder is added to sys.path once, so that it
+# can import helper modules next to it); after that, the same module is
+# returned, so a long-running process (e.g., a tournament worker) never
+# imports a player twice. The time taken by every import is recorded, which
+# helps to spot players that are slow to start.
+#
+# Example:
+#     $ python registry.py            # import every player and list the times
+
+import importlib.util
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.realpath(__file__))
+
+
+class Registry:
+    """Catalogue of AI player files, each imported the first time it is loaded.
+
+    Parameters
+    ----------
+    directory : str or None
+        Folder containing the AI players (default=the players folder in the repository).
+
+    Attributes
+    ----------
+    files : dict
+        Path of every AI player file found in the folder, by player name (the filename
+        without its extension).
+    modules : dict
+        Modules imported so far, by path.
+    times : dict
+        Time taken to import each module, in seconds, by path.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.path.join(ROOT, 'players')
+        self.files = {}
+        self.modules = {}
+        self.times = {}
+        self.discover()
+
+    def __contains__(self, player):
+        return player in self.files
+
+    def __iter__(self):
+        return iter(self.files)
+
+    def __len__(self):
+        return len(self.files)
+
+    def __repr__(self):
+        return f"Registry('{self.directory}', players={len(self)}, loaded={len(self.modules)})"
+
+    def discover(self):
+        """List the AI player files in the folder (without importing them)."""
+        self.files = {}
+        if os.path.isdir(self.directory):
+            for filename in sorted(os.listdir(self.directory)):
+                name, ext = os.path.splitext(filename)
+                if ext == '.py' and not name.startswith('_'):
+                    self.files[name] = os.path.join(self.directory, filename)
+
+    def is_loaded(self, player):
+        """Has this player (a name or filename, see path) been imported already?"""
+        return self.path(player) in self.modules
+
+    def load(self, player):
+        """Import an AI player, unless it has been imported before.
+
+        Like a normal import, this may run code in the player's folder, which is added to
+        sys.path (if needed) first.
+
+        Parameters
+        ----------
+        player : str
+            Name of a player in the folder (e.g., 'minimax'), or the filename of any AI player.
+
+        Returns
+        -------
+        ai : module
+            The AI player (the same module every time for the same file).
+
+        Raises
+        ------
+        ImportError
+            If there is no such file. Any error raised while importing it is passed on.
+        """
+        path = self.path(player)
+        if path in self.modules:
+            return self.modules[path]
+        if not os.path.isfile(path):
+            raise ImportError(f"No AI player file at {path}")
+
+        folder, filename = os.path.split(path)
+        if folder not in sys.path:
+            sys.path.append(folder) # lets the player import helper modules from its folder
+        name = os.path.splitext(filename)[0]
+        spec = importlib.util.spec_from_file_location(name, path)
+        ai = importlib.util.module_from_spec(spec)
+        registered = name not in sys.modules
+        if registered:
+            sys.modules[name] = ai # lets worker processes find the player's functions by name
+        start = time.perf_counter()
+        try:
+            spec.loader.exec_module(ai)
+        except BaseException:
+            if registered:
+                del sys.modules[name]
+            raise
+        self.times[path] = time.perf_counter() - start
+        self.modules[path] = ai
+        return ai
+
+    def path(self, player):
+        """Path of the file for a player name (see files) or filename."""
+        return self.files.get(player) or os.path.abspath(player)
+
+
+REGISTRY = Registry() # shared by every game in this process (see utils.load_players)
+
+if __name__ == "__main__":
+    for name in REGISTRY:
+        try:
+            REGISTRY.load(name)
+            print(f"{name:>16}: {1000 * REGISTRY.times[REGISTRY.path(name)]:8.1f} ms")
+        except Exception as e:
+            print(f"{name:>16}: failed ({e!r})")
@@ -0,0 +1,257 @@
+# solver.py
+# Perfect-play Connect Four solver for positions near the end of the game.
+#
+# The solver runs an exact negamax search on bitboards (see bitboard.py),
+# narrowing in on the true score with null-window probes. Scores follow the
+# usual convention for Connect Four solvers: 0 for a draw, a positive score
+# if the side to move wins (larger when it wins sooner), and a negative score
+# if it loses. On the standard 6x7 board, a score of s means that the winner
+# connects four with their (22 - s)th disc.
+#
+# An exact search is only practical when few empty cells remain, so players
+# should call it once the board is nearly full and fall back to a heuristic
+# search otherwise (see players/minimax.py).
+
+import time
+from bitboard import Bitboard
+from transposition import LOWER, UPPER, TranspositionTable
+
+
+class SolverTimeout(Exception):
+    """Raised when the solver runs past its deadline."""
+    pass
+
+
+class Solver:
+    """Exact solver with its own transposition table.
+
+    The table is keyed by the position itself, so it stays valid across moves and games
+    on the same board size. Reuse one solver for as long as possible.
+
+    Parameters
+    ----------
+    rows : int
+        Number of rows on the board (default=6).
+    cols : int
+        Number of columns on the board (default=7).
+    max_bytes : int
+        Approximate memory budget for the transposition table, in bytes (default=64 MiB).
+    """
+
+    def __init__(self, rows=6, cols=7, max_bytes=64 * 2**20):
+        self.rows = rows
+        self.cols = cols
+        self.size = rows * cols
+        self.table = TranspositionTable(max_bytes)
+        self.nodes = 0
+        self.deadline = None
+
+        # Geometry of the bitboard layout (see bitboard.py)
+        template = Bitboard(rows, cols)
+        self.height = template.height
+        self.bottom = template.bottom
+        self.full = template.full
+        self.column_masks = [((1 << rows) - 1) << (col * self.height) for col in range(cols)]
+        self.order = sorted(range(cols), key=lambda col: abs(col - (cols - 1) / 2)) # centre first
+
+    def __repr__(self):
+        return f"Solver(rows={self.rows}, cols={self.cols}, nodes={self.nodes})"
+
+    def winning_cells(self, pos, mask):
+        """Bitmask of the empty cells that would complete four in a row for the discs in pos."""
+        # Vertical
+        r = (pos << 1) & (pos << 2) & (pos << 3)
+
+        # Horizontal and both diagonals
+        for shift in (self.height, self.height - 1, self.height + 1):
+            p = (pos << shift) & (pos << (2 * shift))
+            r |= p & (pos << (3 * shift))
+            r |= p & (pos >> shift)
+            p = (pos >> shift) & (pos >> (2 * shift))
+            r |= p & (pos << shift)
+            r |= p & (pos >> (3 * shift))
+
+        return r & (self.full ^ mask)
+
+    def negamax(self, current, mask, nmoves, alpha, beta):
+        """Score a position (current = discs of the side to move), assuming nobody can
+        win on this move; the result is exact if it lies strictly between alpha and beta."""
+        self.nodes += 1
+        if self.deadline is not None and self.nodes & 1023 == 0 and time.time() > self.deadline:
+            raise SolverTimeout
+
+        possible = (mask + self.bottom) & self.full
+        opponent = current ^ mask
+        threats = self.winning_cells(opponent, mask)
+        forced = possible & threats
+        if forced:
+            if forced & (forced - 1): # more than one threat to block, so we lose
+                return -((self.size - nmoves) // 2)
+            possible = forced
+        possible &= ~(threats >> 1) # never play directly below an opponent threat
+        if not possible:
+            return -((self.size - nmoves) // 2)
+        if nmoves >= self.size - 2: # no moves left for either player to win with
+            return 0
+
+        # Tighten the window with the best and worst possible outcomes
+        low = -((self.size - 2 - nmoves) // 2)
+        if alpha < low:
+            alpha = low
+            if alpha >= beta:
+                return alpha
+        high = (self.size - 1 - nmoves) // 2
+        key = current + mask
+        entry = self.table.probe(key)
+        if entry is not None:
+            _, flag, value, _ = entry
+            if flag == UPPER and value < high:
+                high = value
+            elif flag == LOWER and value > low:
+                low = value
+                if alpha < low:
+                    alpha = low
+        if beta > high:
+            beta = high
+        if alpha >= beta:
+            return alpha
+
+        # Try moves that create the most new threats first (ties broken by centre-first)
+        moves = []
+        for col in self.order:
+            move = possible & self.column_masks[col]
+            if move:
+                after = current | move
+                moves.append((-bin(self.winning_cells(after, mask | move)).count('1'), len(moves), move))
+        moves.sort()
+
+        for _, _, move in moves:
+            score = -self.negamax(opponent, mask | move, nmoves + 1, -beta, -alpha)
+            if score >= beta:
+                self.table.store(key, 0, LOWER, score, None)
+                return score
+            if score > alpha:
+                alpha = score
+        self.table.store(key, 0, UPPER, alpha, None)
+        return alpha
+
+    def solve(self, bb, deadline=None):
+        """Compute the exact score of a position.
+
+        Parameters
+        ----------
+        bb : Bitboard or np.array of ints
+            The position to solve (must be on this solver's board size).
+        deadline : float or None
+            Time (as returned by time.time()) after which to give up.
+
+        Returns
+        -------
+        score : int
+            The score of the position for the side to move (see the top of this file).
+
+        Raises
+        ------
+        SolverTimeout
+            If the deadline passes before the position is solved.
+        """
+        if not isinstance(bb, Bitboard):
+            bb = Bitboard.from_array(bb)
+        current, mask = bb.masks[bb.turn], bb.mask
+        if self.winning_cells(current, mask) & ((mask + self.bottom) & self.full):
+            return (self.size + 1 - bb.nmoves) // 2
+        return self.search(current, mask, bb.nmoves, deadline)
+
+    def search(self, current, mask, nmoves, deadline=None):
+        """Narrow in on the exact score with null-window probes of negamax."""
+        self.deadline = deadline
+        low = -((self.size - nmoves) // 2)
+        high = (self.size + 1 - nmoves) // 2
+        while low < high:
+            med = low + (high - low) // 2
+            if med <= 0 and int(low / 2) < med: # probe closer to a draw first
+                med = int(low / 2)
+            elif med >= 0 and high // 2 > med:
+                med = high // 2
+            score = self.negamax(current, mask, nmoves, med, med + 1)
+            if score <= med:
+                high = score
+            else:
+                low = score
+        return low
+
+    def best_move(self, bb, deadline=None):
+        """Find a move that achieves the exact score of a position.
+
+        Parameters
+        ----------
+        bb : Bitboard or np.array of ints
+            The position to solve (must be on this solver's board size).
+        deadline : float or None
+            Time (as returned by time.time()) after which to give up.
+
+        Returns
+        -------
+        col : int
+            The column (0-indexing) of the best move.
+        score : int
+            The score of the position for the side to move.
+
+        Raises
+        ------
+        SolverTimeout
+            If the deadline passes before the position is solved.
+        """
+        if not isinstance(bb, Bitboard):
+            bb = Bitboard.from_array(bb)
+        current, mask, nmoves = bb.masks[bb.turn], bb.mask, bb.nmoves
+        possible = (mask + self.bottom) & self.full
+
+        # Take an immediate win if there is one
+        wins = self.winning_cells(current, mask) & possible
+        for col in self.order:
+            if wins & self.column_masks[col]:
+                return col, (self.size + 1 - nmoves) // 2
+
+        score = self.search(current, mask, nmoves, deadline)
+        fallback = None
+        for col in self.order:
+            move = possible & self.column_masks[col]
+            if not move:
+                continue
+            fallback = col if fallback is None else fallback
+            # The child scores at least -score for the opponent; check whether it is exactly that
+            child = current ^ mask, mask | move, nmoves + 1
+            if self.winning_cells(*child[:2]) & ((child[1] + self.bottom) & self.full):
+                continue # the opponent could win immediately
+            if -self.negamax(*child, -score, -score + 1) >= score:
+                return col, score
+        return fallback, score # every move loses immediately
+
+    def outcome(self, score, nmoves):
+        """Translate a score into words.
+
+        Parameters
+        ----------
+        score : int
+            Score of a position for the side to move (see solve).
+        nmoves : int
+            Number of discs on the board in that position.
+
+        Returns
+        -------
+        result : str
+            'win', 'loss', or 'draw' for the side to move.
+        distance : int or None
+            Number of moves (by both players, counting the final one) until the game
+            ends with perfect play; None for a draw.
+        """
+        if score == 0:
+            return 'draw', None
+        # The game ends when the disc with index m (0-indexing) is played, where
+        # m = size - 2 * |score| (or one more), with the parity of the winner
+        winner_parity = nmoves % 2 if score > 0 else 1 - nmoves % 2
+        m = self.size - 2 * abs(score)
+        if m % 2 != winner_parity:
+            m += 1
+        return ('win' if score > 0 else 'loss'), m - nmoves + 1
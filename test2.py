@@ -1,4 +1,5 @@
 import numpy as np
+import utils
 
 a = np.array(([[1, 2, 3, 4, 5], 
                 [6, 7, 8, 9, 10], 
@@ -7,12 +8,11 @@ a = np.array(([[1, 2, 3, 4, 5],
                 [21, 22, 23, 24, 25],
                 [1,1,1,1,1]]))
 
-diags = [a[::-1,:].diagonal(i) for i in range(-a.shape[0]+1,a.shape[1])]
+# Every four-in-a-row window on the board comes from a cached table of linear indices,
+# so there is no need to slice out the diagonals by hand.
+windows = utils.get_windows(*a.shape)
+print(a.take(windows).tolist())
 
-# Now back to the original array to get the upper-left-to-lower-right diagonals,
-# starting from the right, so the range needed for shape (x,y) was y-1 to -x+1 descending.
-diags.extend(a.diagonal(i) for i in range(a.shape[1]-1,-a.shape[0],-1))
-
-# Another list comp to convert back to Python lists from numpy arrays,
-# so it prints what you requested.
-print([n.tolist() for n in diags])
+# The reverse map lists the windows that pass through each cell (padded with -1).
+cell_windows = utils.get_cell_windows(*a.shape)
+print([a.take(windows[i]).tolist() for i in cell_windows[utils.sub2ind(a.shape[1], 2, 2)] if i >= 0])
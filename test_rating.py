@@ -0,0 +1,51 @@
+# test_rating.py
+# Checks for the Elo ratings and the sequential test in rating.py.
+#
+# Run with pytest, or as a script:
+#     $ python test_rating.py
+
+import math
+import rating
+
+
+def test_sprt_decides_sweeps():
+    assert rating.sprt(200, 0, 0, 0, 10)[1] == 'H1'
+    assert rating.sprt(0, 200, 0, 0, 10)[1] == 'H0'
+    assert rating.sprt(0, 0, 200, 0, 10)[1] == 'H0' # only draws: not stronger
+    assert rating.sprt(1, 0, 0, 0, 10)[1] is None # too early to tell
+
+
+def test_sprt_undecided():
+    assert rating.sprt(0, 0, 0) == (0.0, None)
+    llr, decision = rating.sprt(10, 10, 5, 0, 10)
+    assert decision is None and llr < 0
+
+
+def test_ratings_fit():
+    ratings = rating.Ratings(['a', 'b'], prior=1.0)
+    for winner in (1, 1, 1, 2):
+        ratings.add('a', 'b', winner)
+    elo, error = ratings.fit()
+
+    # 3 wins out of 4, plus one virtual draw: an expected score of 3.5 / 5
+    assert math.isclose(elo[0] - elo[1], -400 * math.log10(5 / 3.5 - 1), abs_tol=1e-6)
+    assert math.isclose(elo[0], -elo[1], abs_tol=1e-6) # relative to the average player
+    assert all(0 < e < math.inf for e in error)
+
+
+def test_ratings_table_order():
+    ratings = rating.Ratings(['weak', 'middle', 'strong'])
+    for _ in range(5):
+        ratings.add('strong', 'middle', 1)
+        ratings.add('middle', 'weak', 1)
+        ratings.add('weak', 'strong', 2)
+    table = ratings.table()
+    assert [row[0] for row in table] == ['strong', 'middle', 'weak']
+    assert [row[3] for row in table] == [10, 10, 10]
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"{name}: ok")
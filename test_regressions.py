@@ -0,0 +1,177 @@
+# test_regressions.py
+# Checks for bugs that have been fixed, so that they stay fixed.
+#
+# Run with pytest, or as a script:
+#     $ python test_regressions.py
+
+import numpy as np
+import utils
+from registry import REGISTRY
+
+
+def lost_turn_board():
+    """A 6x7 board on which red (player index 1) moves next, although both players have
+    the same number of discs, because yellow lost a turn. Red wins at once in column 0
+    (0-indexing); yellow would win in column 6 if it were yellow's turn."""
+    board = np.zeros((6, 7), dtype=int)
+    board[0:3, 0] = 2
+    board[0:3, 6] = 1
+    return board
+
+
+def test_board_copy_then_write():
+    board = utils.Board(np.zeros((6, 7), dtype=int))
+    for player in (0, 1, 0, 1, 0):
+        utils.make_move(board, player, 3)
+    view = utils.read_only(board)
+    copy = view.copy()
+    copy[5][3] = 2 # direct writes, as players often do
+    copy[0][4] = 1
+    assert utils.get_next_available_rows(copy).tolist() == [0, 0, 0, -1, 1, 0, 0]
+    assert not utils.is_valid(copy, 3)
+    assert 3 not in utils.get_valid_moves(copy)
+    assert utils.get_next_available_rows(board).tolist() == [0, 0, 0, 5, 0, 0, 0]
+
+    # Board() makes a copy that keeps track of its heights
+    tracked = utils.Board(view)
+    utils.make_move(tracked, 1, 3)
+    assert utils.get_next_available_rows(tracked).tolist() == [0, 0, 0, -1, 0, 0, 0]
+    assert utils.is_valid(board, 3)
+
+
+def test_solver_side_to_move():
+    minimax = REGISTRY.load('minimax')
+    threshold, minimax.SOLVER_THRESHOLD = minimax.SOLVER_THRESHOLD, 42
+    try:
+        assert minimax.solve_endgame(lost_turn_board(), 1) == 0
+        assert minimax.solve_endgame(lost_turn_board(), 0) == 6
+    finally:
+        minimax.SOLVER_THRESHOLD = threshold
+
+
+def test_book_side_to_move():
+    from bitboard import Bitboard
+    import book
+    import os
+    import tempfile
+    board = lost_turn_board()
+    with tempfile.TemporaryDirectory() as folder:
+        filename = os.path.join(folder, 'test.book')
+        book.write_book(filename, [Bitboard.from_array(board)], [6], plies=8)
+        opening = book.Book(filename)
+        assert opening.lookup(board) == 6 # yellow, from the disc counts
+        assert opening.lookup(board, 0) == 6
+        assert opening.lookup(board, 1) is None
+
+        minimax = REGISTRY.load('minimax')
+        books, minimax.BOOKS = minimax.BOOKS, {board.shape: opening}
+        try:
+            assert minimax.book_move(board, 0) == 6
+            assert minimax.book_move(board, 1) is None
+        finally:
+            minimax.BOOKS = books
+        del opening # close the memory maps before the folder is removed
+
+
+def test_late_move_after_timeout():
+    import connect4
+    import engine
+    import time
+    import types
+    ai = types.ModuleType('slow')
+    def get_computer_move(board, which_player):
+        time.sleep(0.3)
+        return 4
+    ai.get_computer_move = get_computer_move
+
+    player = engine.FunctionPlayer(ai)
+    board = utils.Board(np.zeros((6, 7), dtype=int))
+    player.new_game(board.copy(), 0)
+    try:
+        connect4.get_engine_move(player, 0.05)
+        assert False, "the move should have timed out"
+    except TimeoutError:
+        pass
+    player.new_game(board.copy(), 0) # resync, as the game does after a lost turn
+    time.sleep(0.4) # the abandoned move finishes
+    assert np.count_nonzero(player.board) == 0
+
+
+def test_mcts_side_to_move():
+    import connect4
+    mcts = REGISTRY.load('mcts')
+    players = {'engine': [None, mcts.Player()]} # a human plays yellow
+    board = utils.Board(np.zeros((6, 7), dtype=int))
+    connect4.new_game(players, board)
+
+    def play(player, col):
+        utils.make_move(board, player, col)
+        connect4.notify_move(players, player, col, board)
+
+    play(0, 3)
+    connect4.notify_move(players, 1, None, board) # red loses its turn
+    play(0, 3)
+    red = players['engine'][1]
+    assert red.position.turn == 1
+    col = red.choose_move(None) - 1
+    play(1, col) # the game does not notify the player about its own move
+    assert (red.position.to_array() == board).all()
+    assert red.position.turn == 0
+
+    # The function-based player is told whose turn it is
+    assert mcts.get_computer_move(lost_turn_board(), 1) == 1
+
+
+def test_no_pondering_while_busy():
+    import connect4
+    import threading
+    minimax = utils.load_players('minimax', 'minimax')['engine']
+    mcts = utils.load_players('mcts', 'mcts')['engine']
+    assert connect4.get_owner(minimax[0]) is connect4.get_owner(minimax[1]) # shared globals
+    assert connect4.get_owner(mcts[0]) is not connect4.get_owner(mcts[1]) # state is kept per Player
+
+    # A move that ran out of time keeps both seats of its module from pondering until it ends
+    release = threading.Event()
+    thread = threading.Thread(target=release.wait, daemon=True)
+    thread.start()
+    connect4.BUSY[connect4.get_owner(minimax[0])] = thread
+    try:
+        assert connect4.is_busy(minimax[1])
+        assert not connect4.is_busy(mcts[0])
+        release.set()
+        thread.join()
+        assert not connect4.is_busy(minimax[1])
+    finally:
+        release.set()
+        connect4.BUSY.pop(connect4.get_owner(minimax[0]), None)
+
+
+def test_player_imports_sibling_module():
+    import os
+    import sys
+    import tempfile
+    from registry import Registry
+    with tempfile.TemporaryDirectory() as folder:
+        with open(os.path.join(folder, 'sibling_helper.py'), 'w') as f:
+            f.write("COLUMN = 3\n")
+        with open(os.path.join(folder, 'sibling_player.py'), 'w') as f:
+            f.write("import sibling_helper\n"
+                    "def get_computer_move(board, which_player):\n"
+                    "    return sibling_helper.COLUMN\n")
+        registry = Registry(folder)
+        try:
+            ai = registry.load('sibling_player')
+            assert ai.get_computer_move(None, 0) == 3
+            assert registry.load(os.path.join(folder, 'sibling_player.py')) is ai
+            assert sys.path.count(folder) == 1
+        finally:
+            sys.path.remove(folder)
+            for name in ('sibling_player', 'sibling_helper'):
+                sys.modules.pop(name, None)
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,264 @@
+# tournament.py
+# Run many Connect Four games between AI players in parallel.
+#
+# Every pairing of players plays a number of games (alternating who goes
+# first) without graphics, spread across all cores with a process pool.
+# The results are aggregated into a standings table and Elo ratings.
+#
+# Examples:
+#     $ python tournament.py players/*.py --games 20 --rows 6 --cols 7
+#     $ python tournament.py new.py old.py --games 2000 --sprt 0 10
+
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import itertools
+import numpy as np
+import os
+import random
+import sys
+import time
+import connect4
+import rating
+import utils
+
+parser = argparse.ArgumentParser(description="Run a Connect Four tournament between AI players.")
+parser.add_argument('players', metavar='player', type=str, nargs='+', help="names of the AI files to enter into the tournament")
+parser.add_argument('-g', '--games', type=int, help="number of games per pairing (default=10)", default=10)
+parser.add_argument('-r', '--rows', type=int, help="number of rows on the board (default=6)", default=6)
+parser.add_argument('-c', '--cols', type=int, help="number of columns on the board (default=7)", default=7)
+parser.add_argument('-b', '--board', type=str, help="filename containing starting board state")
+parser.add_argument('-t', '--timeout', type=float, help=f"maximum time per AI move, in seconds (default={connect4.TIMEOUT}, 0=unlimited)", default=connect4.TIMEOUT)
+parser.add_argument('-m', '--mode', choices=['roundrobin', 'gauntlet'], help="play every pairing (roundrobin, default) or only the first player against the rest (gauntlet)", default='roundrobin')
+parser.add_argument('-w', '--workers', type=int, help="number of worker processes (default=number of cores)", default=os.cpu_count())
+parser.add_argument('-s', '--seed', type=int, help="random seed, so tournaments can be repeated (default=0)", default=0)
+parser.add_argument('--sprt', metavar=('ELO0', 'ELO1'), type=float, nargs=2, help="stop each pairing early once an SPRT decides whether the first player is ELO0 or ELO1 points stronger (then --games is the maximum)")
+parser.add_argument('--verbose', action='store_true', help="display game details, including output from the AI players")
+
+_PLAYERS = {} # cache of loaded players in each worker process, keyed by pairing
+_VERBOSE = False
+
+def main(args):
+    if args.verbose:
+        print("\nLet's play a Connect Four tournament!")
+        print("=" * 50)
+
+    pairings = get_pairings(args.players, args.mode)
+    if args.verbose: print(f"Playing {len(pairings) * args.games} games using {args.workers} worker(s)...")
+
+    start = time.time()
+    standings, ratings, decisions = run(pairings=pairings, **vars(args))
+    if args.verbose: print(f"Finished in {time.time() - start:.1f} seconds.\n")
+
+    print_standings(standings)
+    print()
+    print_ratings(ratings)
+    if args.sprt:
+        print()
+        for (i, j), (llr, decision) in decisions.items():
+            verdict = {'H1': f"at least {args.sprt[1]:g} Elo stronger", 'H0': f"not stronger than {args.sprt[0]:g} Elo", None: "undecided"}[decision]
+            print(f"SPRT {standings[i]['name']} vs. {standings[j]['name']}: {verdict} (LLR={llr:.2f})")
+
+def get_pairings(players, mode='roundrobin'):
+    """List the pairs of players that will face each other.
+
+    Parameters
+    ----------
+    players : list of str
+        Names of the AI files in the tournament.
+    mode : str
+        'roundrobin' (every pair of players) or 'gauntlet' (the first player against the rest).
+
+    Returns
+    -------
+    pairings : list of tuples
+        Pairs of player indices (i, j) into the list of players.
+    """
+    if len(players) < 2:
+        raise Exception('A tournament needs at least two players. Check inputs.')
+    if mode == 'gauntlet':
+        return [(0, j) for j in range(1, len(players))]
+    return list(itertools.combinations(range(len(players)), 2))
+
+def init_worker(verbose=False):
+    """Set up a worker process (silences the AI players unless verbose)."""
+    global _VERBOSE
+    _VERBOSE = verbose
+    if not verbose:
+        sys.stdout = open(os.devnull, 'w')
+
+def play_game(task):
+    """Play one game in a worker process.
+
+    Parameters
+    ----------
+    task : tuple
+        (game, first, second, files, kwargs), where first and second are player indices
+        (first plays yellow), files are the names of the AI files for both players, and
+        kwargs are passed to connect4.play_headless.
+
+    Returns
+    -------
+    first : int
+        Player index of the first player.
+    second : int
+        Player index of the second player.
+    result : dict
+        Summary of the game from connect4.play_headless.
+    """
+    game, first, second, files, kwargs = task
+
+    # Load each pairing once per worker; later games reuse the imported modules
+    if files not in _PLAYERS:
+        players = utils.load_players(*files)
+        if not players:
+            raise Exception(f'Cannot load AI players {files}. Check inputs.')
+        _PLAYERS[files] = players
+
+    # Seed each game separately, so results do not depend on which worker played it
+    seed = kwargs.pop('seed') + game
+    random.seed(seed)
+    np.random.seed(seed % 2**32)
+    return first, second, connect4.play_headless(_PLAYERS[files], verbose=_VERBOSE, **kwargs)
+
+def run(players, pairings, games=10, rows=6, cols=7, board=None, timeout=connect4.TIMEOUT, workers=None, seed=0, sprt=None, verbose=False, **kwargs):
+    """Play every game in the tournament and aggregate the results.
+
+    Parameters
+    ----------
+    players : list of str
+        Names of the AI files in the tournament.
+    pairings : list of tuples
+        Pairs of player indices that face each other (see get_pairings).
+    games : int
+        Number of games per pairing, alternating who goes first (default=10).
+    rows, cols, board, timeout
+        Passed on to connect4.play_headless.
+    workers : int
+        Number of worker processes (default=number of cores).
+    seed : int
+        Random seed for the first game (default=0).
+    sprt : tuple of floats
+        (elo0, elo1) hypotheses for a sequential test of each pairing (see rating.sprt).
+        Once a pairing is decided, no more of its games are started (default=None).
+    verbose : bool
+        Print status updates to the terminal (default=False).
+
+    Returns
+    -------
+    standings : list of dicts
+        Results for each player, in the same order as players (see new_record).
+    ratings : rating.Ratings
+        Every game result, for computing Elo ratings.
+    decisions : dict
+        SPRT (llr, decision) for each pairing, from the point of view of its first player.
+    """
+    workers = workers or os.cpu_count()
+    standings = [new_record(player) for player in players]
+    ratings = rating.Ratings([entry['name'] for entry in standings])
+    matches = {pairing: [0, 0, 0] for pairing in pairings} # W/L/D for the first player in each pairing
+    decisions = {pairing: (0.0, None) for pairing in pairings}
+
+    def schedule():
+        # Interleave the pairings, skipping those the SPRT has already decided
+        for g in range(games):
+            for i, j in pairings:
+                if decisions[(i, j)][1] is not None:
+                    continue
+                first, second = (i, j) if g % 2 == 0 else (j, i)
+                options = {'rows': rows, 'cols': cols, 'board': board, 'timeout': timeout, 'seed': seed}
+                game = g * len(pairings) + pairings.index((i, j))
+                yield (game, first, second, (players[first], players[second]), options)
+
+    tasks = schedule()
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(verbose,)) as pool:
+        pending = {pool.submit(play_game, task) for task in itertools.islice(tasks, 2 * workers)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                first, second, result = future.result()
+                record(standings, first, second, result)
+                winner = adjudicate(result)
+                ratings.add(first, second, winner)
+                if verbose:
+                    print(f"\t{standings[first]['name']} vs. {standings[second]['name']}: {describe(result)}")
+
+                # Update the sequential test for this pairing
+                pairing = (first, second) if (first, second) in matches else (second, first)
+                if winner == 0:
+                    matches[pairing][2] += 1
+                elif (winner == 1) == (first == pairing[0]): # first player in the pairing won
+                    matches[pairing][0] += 1
+                else:
+                    matches[pairing][1] += 1
+                if sprt and decisions[pairing][1] is None:
+                    decisions[pairing] = rating.sprt(*matches[pairing], *sprt)
+            pending |= {pool.submit(play_game, task) for task in itertools.islice(tasks, len(done))}
+    return standings, ratings, decisions
+
+def new_record(player):
+    """Create an empty record of results for one player.
+
+    Keys include 'name', 'wins', 'losses', 'draws', 'illegal' (forfeits from illegal moves),
+    'errors' and 'timeouts' (turns lost), 'time' (total thinking time, in seconds), and
+    'turns' (number of decisions).
+    """
+    name = ''.join(os.path.basename(player).split('.')[:-1]) or player
+    return {'name': name, 'wins': 0, 'losses': 0, 'draws': 0, 'illegal': 0,
+            'errors': 0, 'timeouts': 0, 'time': 0.0, 'turns': 0}
+
+def adjudicate(result):
+    """Determine who won a game (1=first player, 2=second player, 0=tie), counting illegal moves as losses."""
+    if result['forfeit'] is not None:
+        return 3 - result['forfeit']
+    return max(result['winner'], 0)
+
+def record(standings, first, second, result):
+    """Add the result of one game to the standings (see connect4.play_headless)."""
+    winner = adjudicate(result)
+    for k, index in enumerate((first, second)):
+        entry = standings[index]
+        if winner == k + 1:
+            entry['wins'] += 1
+        elif winner == 2 - k:
+            entry['losses'] += 1
+        else:
+            entry['draws'] += 1
+        entry['illegal'] += result['forfeit'] == k + 1
+        entry['errors'] += result['errors'][k]
+        entry['timeouts'] += result['timeouts'][k]
+        entry['time'] += result['time'][k]
+        entry['turns'] += result['turns'][k]
+
+def describe(result):
+    """Summarize the outcome of one game in a few words."""
+    if result['forfeit'] is not None:
+        return f"player {result['forfeit']} forfeits (illegal move)"
+    if result['winner'] == 0:
+        return f"tie after {len(result['moves'])} moves"
+    return f"player {result['winner']} wins in {len(result['moves'])} moves"
+
+def print_standings(standings):
+    """Print the standings as a table, sorted by points (1 per win, 0.5 per draw)."""
+    width = max(len('Player'), *(len(entry['name']) for entry in standings))
+    print(f"{'Player':<{width}}  {'W':>5} {'L':>5} {'D':>5} {'Points':>7}  {'ms/move':>8}  {'Illegal':>7} {'Errors':>6} {'Timeouts':>8}")
+    print('-' * (width + 63))
+    ranked = sorted(standings, key=lambda entry: entry['wins'] + entry['draws'] / 2, reverse=True)
+    for entry in ranked:
+        points = entry['wins'] + entry['draws'] / 2
+        latency = 1000 * entry['time'] / entry['turns'] if entry['turns'] else 0
+        print(f"{entry['name']:<{width}}  {entry['wins']:>5} {entry['losses']:>5} {entry['draws']:>5} {points:>7.1f}  "
+              f"{latency:>8.2f}  {entry['illegal']:>7} {entry['errors']:>6} {entry['timeouts']:>8}")
+
+def print_ratings(ratings, confidence=0.95):
+    """Print the Elo rating of each player, with confidence intervals."""
+    rows = ratings.table(confidence)
+    width = max(len('Player'), *(len(row[0]) for row in rows))
+    print(f"{'Player':<{width}}  {'Elo':>7}  {f'+/- ({confidence:.0%})':>11}  {'Games':>6}")
+    print('-' * (width + 32))
+    for name, elo, margin, games in rows:
+        print(f"{name:<{width}}  {elo:>7.1f}  {margin:>11.1f}  {games:>6}")
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    utils.check_args(args)
+    main(args)
@@ -0,0 +1,148 @@
+# transposition.py
+# Zobrist hashing and a bounded transposition table for game-tree searches.
+#
+# A Zobrist key assigns a random 64-bit number to every (player, row, col)
+# combination and XORs together the numbers for every disc on the board, so
+# dropping or removing a disc updates the key with a single XOR. The table
+# stores search results under those keys so that positions reached through
+# different move orders are only searched once.
+
+import numpy as np
+
+EXACT, LOWER, UPPER = 0, 1, 2 # bound types for stored values
+ENTRY_BYTES = 128 # approximate memory used by one table entry, in bytes
+
+
+class Zobrist:
+    """Random keys for incrementally hashing boards of a given size.
+
+    Parameters
+    ----------
+    rows : int
+        Number of rows on the board.
+    cols : int
+        Number of columns on the board.
+    seed : int
+        Seed for the random number generator (default=0), so keys are reproducible.
+    """
+
+    def __init__(self, rows, cols, seed=0):
+        rng = np.random.default_rng(seed)
+        keys = rng.integers(0, 2**63, size=(2, rows, cols), dtype=np.int64)
+        self.shape = (rows, cols)
+        self.keys = keys.tolist() # plain Python ints are much faster to XOR
+        self.side = int(rng.integers(0, 2**63)) # toggled when player 2 is to move
+
+    def hash(self, board, player=1):
+        """Compute the key for a board from scratch.
+
+        Parameters
+        ----------
+        board : np.array of ints
+            2D array for the current state of the board (0=empty, 1=player1, 2=player2).
+        player : int
+            The player to move (using 1-indexing!).
+
+        Returns
+        -------
+        key : int
+            The Zobrist key of the position.
+        """
+        key = self.side if player == 2 else 0
+        for row, col in zip(*np.nonzero(board)):
+            key ^= self.keys[board[row, col] - 1][row][col]
+        return key
+
+    def toggle(self, key, row, col, player):
+        """Add or remove a disc (player using 1-indexing!) and pass the turn."""
+        return key ^ self.keys[player - 1][row][col] ^ self.side
+
+
+class TranspositionTable:
+    """Fixed-size hash table of search results.
+
+    Each slot holds the key, search depth, bound type, value, best move, and the
+    search generation that stored it. When two positions map to the same slot,
+    the new entry replaces the old one if the old entry came from an earlier
+    search or was searched to the same depth or less.
+
+    Parameters
+    ----------
+    max_bytes : int
+        Approximate memory budget for the table, in bytes (default=16 MiB).
+    """
+
+    def __init__(self, max_bytes=16 * 2**20):
+        self.size = max(1, int(max_bytes) // ENTRY_BYTES)
+        self.clear()
+
+    def __len__(self):
+        return self.size - self.keys.count(None)
+
+    def __repr__(self):
+        return f"TranspositionTable(size={self.size}, hits={self.hits}, probes={self.probes})"
+
+    def clear(self):
+        """Remove every entry and reset the statistics."""
+        self.keys = [None] * self.size
+        self.depths = [-1] * self.size
+        self.flags = [EXACT] * self.size
+        self.values = [0] * self.size
+        self.moves = [None] * self.size
+        self.ages = [0] * self.size
+        self.age = 0
+        self.hits = 0
+        self.probes = 0
+
+    def new_search(self):
+        """Start a new search generation, so older entries become replaceable."""
+        self.age += 1
+
+    def probe(self, key):
+        """Look up a position.
+
+        Parameters
+        ----------
+        key : int
+            The Zobrist key of the position.
+
+        Returns
+        -------
+        entry : tuple or None
+            (depth, flag, value, move) if the position is stored; None otherwise.
+        """
+        self.probes += 1
+        i = key % self.size
+        if self.keys[i] != key:
+            return None
+        self.hits += 1
+        self.ages[i] = self.age # refresh entries that are still useful
+        return self.depths[i], self.flags[i], self.values[i], self.moves[i]
+
+    def store(self, key, depth, flag, value, move):
+        """Save a search result, subject to the replacement policy.
+
+        Parameters
+        ----------
+        key : int
+            The Zobrist key of the position.
+        depth : int
+            Remaining search depth used to compute the value.
+        flag : int
+            EXACT, LOWER (value is a lower bound), or UPPER (value is an upper bound).
+        value : float
+            The search value of the position.
+        move : int or None
+            The best move (0-indexing) found in the position, if any.
+        """
+        i = key % self.size
+        if self.keys[i] not in (None, key) and self.ages[i] == self.age and self.depths[i] > depth:
+            return # keep the deeper entry from the current search
+        if self.keys[i] == key and move is None:
+            move = self.moves[i] # keep the previous best move for this position
+        self.keys[i] = key
+        self.depths[i] = depth
+        self.flags[i] = flag
+        self.values[i] = value
+        self.moves[i] = move
+        self.ages[i] = self.age
@@ -3,13 +3,18 @@
 #
 # Author: Matthew Eicholtz
 
-from graphics import *
-import importlib
+from bitboard import Bitboard
 import numpy as np
 import os
 import pdb
+from registry import REGISTRY
 import subprocess
-import sys
+import time
+
+# NOTE: The graphics module is imported inside setup() rather than here, because importing
+# it creates a Tk root window. That way, AI players and headless games can import utils on
+# machines without a display. Likewise, engine (which uses utils) is imported inside
+# load_players to avoid a circular import.
 
 ROOT = os.path.dirname(os.path.realpath(__file__))
 COLORS = { # dictionary of colors relevant to the game user interface
@@ -22,8 +27,103 @@ COLORS = { # dictionary of colors relevant to the game user interface
 	}
 DISC = 25 # radius of each disc, in pixels
 FONT = 12 # font size for instructions
+FPS = 60 # maximum number of times per second the game window is redrawn
+GRAVITY = 3000 # acceleration of falling discs (see drop), in pixels per second squared
 HEADER = 30 # space for instructions at the top of the board, in pixels
 MARGIN = 15 # margin on side of the board, in pixels
+WINDOWS = {} # cache of winning-line tables for each board shape (see get_windows)
+
+class Board(np.ndarray):
+    """A NumPy board that also keeps track of the height of every column.
+
+    It behaves exactly like the 2D array it wraps (0=empty, 1=player1, 2=player2), but
+    make_move, undo_move, and drop keep its heights up to date, so finding the next
+    available row or the valid moves takes O(cols) instead of scanning the whole board.
+    Full views (e.g., read_only) share the heights. Copies (board.copy()), slices, and
+    arrays computed from the board do not have any, and are handled like plain arrays,
+    because code written for plain arrays may change them directly; to get a copy that
+    tracks its heights, use Board(board), which recounts them.
+
+    Parameters
+    ----------
+    board : np.array of ints
+        2D array for the state of the board (copied).
+
+    Attributes
+    ----------
+    heights : np.array of ints or None
+        Number of discs in each column, i.e., the row index of the next disc.
+
+    Notes
+    -----
+    Writing to the board directly (e.g., board[row, col] = 1) does not update the heights;
+    use make_move instead. Every array computed from a Board is also a Board, which adds a
+    little overhead to each operation, so hot loops should work on np.asarray(board).
+    """
+
+    def __new__(cls, board):
+        obj = np.array(board, dtype=int).view(cls)
+        obj.heights = np.count_nonzero(obj, axis=0)
+        return obj
+
+    def __array_finalize__(self, obj):
+        # Only views of the whole board can share its heights
+        heights = getattr(obj, 'heights', None)
+        if heights is not None and self.shape == obj.shape and self.strides == obj.strides \
+                and self.ctypes.data == obj.ctypes.data:
+            self.heights = heights
+        else:
+            self.heights = None
+
+    def __reduce__(self): # keep the heights when pickled (e.g., sent to worker processes)
+        return Board, (np.asarray(self),)
+
+def animate(gui):
+    """Move the falling discs (see drop) to where they should be by now.
+
+    Discs that reach their hole are removed, and the hole is filled in with their color.
+    This only updates the drawing; refresh calls it before every redraw.
+
+    Parameters
+    ----------
+    gui : GraphWin object
+        The main graphics window for the game.
+    """
+    now = time.time()
+    falling = []
+    for disc, hole, color, start, top in gui.falling:
+        y = max(top - GRAVITY * (now - start) ** 2 / 2, hole.getCenter().getY())
+        disc.move(0, y - disc.getCenter().getY())
+        if y > hole.getCenter().getY():
+            falling.append((disc, hole, color, start, top))
+        else: # landed
+            disc.undraw()
+            hole.setFill(color)
+    gui.falling = falling
+    gui.dirty = True
+
+def canonicalize(board):
+    """Map a board and its mirror image (columns reversed) to the same key.
+
+    Mirror-image positions have the same value and mirror-image best moves, so caches
+    keyed this way (transposition tables, opening books, datasets) can share entries.
+
+    Parameters
+    ----------
+    board : np.array of ints or Bitboard
+        2D array for the current state of the board (0=empty, 1=player1, 2=player2).
+
+    Returns
+    -------
+    key : int
+        Key identifying the position up to mirror symmetry (see Bitboard.canonical_key).
+    mirrored : bool
+        True if the key was taken from the mirror image. Use mirror_move to translate
+        moves between the board and the keyed position.
+    """
+    if not isinstance(board, Bitboard):
+        board = Bitboard.from_array(board)
+    return board.canonical_key()
 
 def check_args(args):
     """Helper function to run error checks on the argparse arguments.
@@ -43,34 +143,68 @@ def drop(gui, board, player, col):
 
     Parameters
     ----------
-    gui : GraphWin object
-        The main graphics window for the game.
+    gui : GraphWin object or None
+        The main graphics window for the game (None when playing without graphics).
     board : np.array of ints
         2D array for the current state of the board (0=empty, 1=player1, 2=player2).
     player : int
         The player index (0-indexing) specifying who is taking the action.
     col : int
         The column index (0-indexing) in which to drop the disc.
-    """
-    
-    # Determine which row the disc will drop to
-    rows = get_next_available_rows(board)
-    row = rows[col]
 
-    # Update graphics
-    holes = gui.items[1:-1]
-    disc = holes[sub2ind(board.shape[1], row, col)]
-    disc.setFill(COLORS['player1' if player == 0 else 'player2'])
+    Returns
+    -------
+    row : int
+        The row index (0-indexing) where the disc landed.
+    """
     
     # Update the board
-    board[row][col] = player + 1
+    row = make_move(board, player, col)
+
+    # Update graphics (shown on the next refresh)
+    if gui is not None:
+        color = COLORS['player1' if player == 0 else 'player2']
+        if gui.animate: # drop a disc from the top row, which falls into place as the window is refreshed (see animate)
+            from graphics import Circle
+            top = gui.holes[board.shape[0] - 1, col].getCenter()
+            disc = Circle(top, DISC)
+            disc.setFill(color)
+            disc.setOutline(COLORS['outline'])
+            disc.setWidth(4)
+            disc.draw(gui)
+            gui.falling.append((disc, gui.holes[row, col], color, time.time(), top.getY()))
+        else:
+            gui.holes[row, col].setFill(color)
+        gui.dirty = True
+    return row
+
+def get_cell_windows(rows, cols):
+    """List the four-in-a-row windows that pass through each cell of the board.
+
+    Parameters
+    ----------
+    rows : int
+        Number of rows on the board.
+    cols : int
+        Number of columns on the board.
+
+    Returns
+    -------
+    cell_windows : np.array of ints
+        2D array with one row per cell (using linear indices, see sub2ind), listing the
+        indices of the windows (rows of get_windows) containing that cell. Rows are padded
+        with -1 because cells near the edges belong to fewer windows. Do not modify it;
+        the same array is shared by every caller.
+    """
+    get_windows(rows, cols)
+    return WINDOWS[(rows, cols)][1]
 
 def get_next_available_rows(board, invalid=-1):
     """Find the row index for the next disc in any column.
     
     Parameters
     ----------
-    board : np.array of ints
+    board : np.array of ints or Bitboard
         2D array for the current state of the board (0=empty, 1=player1, 2=player2).
     invalid : int (default=-1)
         Value to provide when no rows are available in a given column.
@@ -80,6 +214,11 @@ def get_next_available_rows(board, invalid=-1):
     rows : np.array of ints
         List of next available row for each column.
     """
+    if isinstance(board, Bitboard):
+        return board.get_next_available_rows(invalid)
+    heights = getattr(board, 'heights', None)
+    if heights is not None:
+        return np.where(heights < board.shape[0], heights, invalid)
     mask = board == 0
     rows = np.where(mask.any(axis=0), mask.argmax(axis=0), invalid)
     return rows
@@ -89,7 +228,7 @@ def get_valid_moves(board):
     
     Parameters
     ----------
-    board: np.array of ints
+    board: np.array of ints or Bitboard
         2D array for the current state of the board (0=empty, 1=player1, 2=player2).
 
     Returns
@@ -97,20 +236,69 @@ def get_valid_moves(board):
     cols : np.array of ints
         List of columns that are not full yet.
     """
+    if isinstance(board, Bitboard):
+        return np.array(board.get_valid_moves(), dtype=int)
     rows = get_next_available_rows(board)
     cols = np.flatnonzero(rows >= 0)
     return cols
 
 def get_version():
-    """Retrieve the current git hash to use as a 'version' number."""
-    return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD']).decode('ascii').strip()
+    """Retrieve the current git hash to use as a 'version' number ('unknown' outside a git repository)."""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError): # no git, or not a repository (e.g., an exported copy)
+        return 'unknown'
+
+def get_windows(rows, cols):
+    """List every possible four-in-a-row (horizontal, vertical, and diagonal) on the board.
+
+    The table is computed once per board size and cached, so evaluators and win checks
+    can share it instead of recomputing the geometry on every call.
+
+    Parameters
+    ----------
+    rows : int
+        Number of rows on the board.
+    cols : int
+        Number of columns on the board.
+
+    Returns
+    -------
+    windows : np.array of ints
+        2D array with one row per window, listing the linear indices (see sub2ind) of its
+        four cells, so board.take(windows) gives the contents of every window. Do not
+        modify it; the same array is shared by every caller.
+    """
+    if (rows, cols) not in WINDOWS:
+        windows = []
+        for dr, dc in ((0, 1), (1, 0), (1, 1), (-1, 1)): # horizontal, vertical, diagonal, anti-diagonal
+            for row in range(rows):
+                for col in range(cols):
+                    if 0 <= row + 3 * dr < rows and 0 <= col + 3 * dc < cols:
+                        windows.append([sub2ind(cols, row + k * dr, col + k * dc) for k in range(4)])
+        windows = np.array(windows, dtype=np.intp).reshape(-1, 4)
+
+        # Build the reverse map from each cell to the windows that contain it
+        members = [[] for _ in range(rows * cols)]
+        for i, window in enumerate(windows):
+            for cell in window:
+                members[cell].append(i)
+        cell_windows = np.full((rows * cols, max(len(m) for m in members)), -1, dtype=np.intp)
+        for cell, m in enumerate(members):
+            cell_windows[cell, :len(m)] = m
+
+        windows.flags.writeable = False
+        cell_windows.flags.writeable = False
+        WINDOWS[(rows, cols)] = (windows, cell_windows)
+    return WINDOWS[(rows, cols)][0]
 
 def is_gameover(board):
     """Check to see if the game is over yet.
     
     Parameters
     ----------
-    board : np.array of ints
+    board : np.array of ints or Bitboard
         2D array for the current state of the board (0=empty, 1=player1, 2=player2).
 
     Returns
@@ -120,6 +308,8 @@ def is_gameover(board):
     winner : int
         Who won the game? (1=player1, 2=player2, 0=tie, -1=undetermined)
     """
+    if isinstance(board, Bitboard):
+        return board.is_gameover()
     if is_winner(board, 1): # player 1 wins
         gameover = True
         winner = 1
@@ -135,6 +325,59 @@ def is_gameover(board):
 
     return gameover, winner
 
+def is_gameover_after(board, row, col, nmoves):
+    """Check to see if the game is over, given the disc that was just dropped.
+
+    Only the lines passing through (row, col) are inspected, so this is much
+    cheaper than is_gameover on large boards. It assumes the game was not
+    already over before the disc was dropped.
+
+    Parameters
+    ----------
+    board : np.array of ints
+        2D array for the current state of the board (0=empty, 1=player1, 2=player2).
+    row : int
+        The row index (0-indexing) of the most recent disc.
+    col : int
+        The column index (0-indexing) of the most recent disc.
+    nmoves : int
+        Total number of discs on the board, including the most recent one.
+
+    Returns
+    -------
+    gameover : bool
+        Is the game over (True) or not (False).
+    winner : int
+        Who won the game? (1=player1, 2=player2, 0=tie, -1=undetermined)
+    """
+    if is_winning_drop(board, row, col):
+        return True, int(board[row][col])
+    if nmoves >= board.size: # tie
+        return True, 0
+    return False, -1
+
+def is_gameover_batch(boards):
+    """Check to see if the game is over for many boards at once.
+
+    Parameters
+    ----------
+    boards : np.array of ints
+        3D array of N stacked board states with shape (N, rows, cols).
+
+    Returns
+    -------
+    gameover : np.array of bools
+        Is each game over (True) or not (False).
+    winner : np.array of ints
+        Who won each game? (1=player1, 2=player2, 0=tie, -1=undetermined)
+    """
+    boards = np.asarray(boards)
+    winner = np.full(boards.shape[0], -1, dtype=int)
+    winner[~(boards == 0).any(axis=(1, 2))] = 0 # tie (board is full)
+    winner[is_winner_batch(boards, 2)] = 2
+    winner[is_winner_batch(boards, 1)] = 1 # player 1 takes precedence, as in is_gameover
+    return winner >= 0, winner
+
 def is_valid(board, col):
     """Determine whether a potential move (defined by a desired column)
     is valid based on the current board state. In other words, is there
@@ -142,7 +385,7 @@ def is_valid(board, col):
 
     Parameters
     ----------
-    board : np.array
+    board : np.array or Bitboard
         2D array for the current state of the board (0=empty, 1=player1, 2=player2).
     col : int
         The column index (0-indexing) to validate.
@@ -153,6 +396,11 @@ def is_valid(board, col):
         True if there is at least one open row available in that column;
         false otherwise.
     """
+    if isinstance(board, Bitboard):
+        return board.can_play(col)
+    heights = getattr(board, 'heights', None)
+    if heights is not None:
+        return 0 <= col < board.shape[1] and heights[col] < board.shape[0]
     rows = get_next_available_rows(board)
     return rows[col] >= 0 and col >= 0
 
@@ -161,7 +409,7 @@ def is_winner(board, player):
     
     Parameters
     ----------
-    board : np.array of ints
+    board : np.array of ints or Bitboard
         2D array for the current state of the board (0=empty, 1=player1, 2=player2).
     player : int
         Which player are we checking? (using 1-indexing here!)
@@ -171,42 +419,96 @@ def is_winner(board, player):
     winner : bool
         Did the player win (True) or not (False)?
     """
+    if isinstance(board, Bitboard):
+        return board.is_winner(player)
+    windows = get_windows(*board.shape)
+    return bool((np.asarray(board).take(windows) == player).all(axis=1).any()) # plain array (see Board)
+
+def is_winner_batch(boards, player):
+    """Check to see if a specific player has connected four discs on many boards at once.
+
+    The check is vectorized with sliding-window sums over shifted views of the
+    boards, so there is no per-cell Python indexing.
+
+    Parameters
+    ----------
+    boards : np.array of ints
+        3D array of N stacked board states with shape (N, rows, cols).
+    player : int
+        Which player are we checking? (using 1-indexing here!)
+
+    Returns
+    -------
+    winner : np.array of bools
+        Did the player win (True) or not (False) on each board?
+    """
+    mine = (np.asarray(boards) == player).astype(np.int8)
+    n, rows, cols = mine.shape
+    winner = np.zeros(n, dtype=bool)
+    for dr, dc in ((0, 1), (1, 0), (1, 1), (-1, 1)):
+        r0 = 3 if dr < 0 else 0 # anti-diagonals start from the fourth row
+        hr, hc = rows - 3 * abs(dr), cols - 3 * dc # number of window origins
+        if hr <= 0 or hc <= 0:
+            continue
+        total = sum(mine[:, r0 + k * dr:r0 + k * dr + hr, k * dc:k * dc + hc] for k in range(4))
+        winner |= (total == 4).any(axis=(1, 2))
+    return winner
+
+def is_winning_drop(board, row, col):
+    """Check to see if the disc at (row, col) is part of four in a row.
+
+    Parameters
+    ----------
+    board : np.array of ints
+        2D array for the current state of the board (0=empty, 1=player1, 2=player2).
+    row : int
+        The row index (0-indexing) of the disc to check.
+    col : int
+        The column index (0-indexing) of the disc to check.
+
+    Returns
+    -------
+    winner : bool
+        Does the disc complete a line of four (True) or not (False)?
+    """
     rows, cols = board.shape
-    # Check vertically
-    for row in range(rows):
-        for col in range(cols - 3):
-            if (board[row][col] == player and
-                    board[row][col + 1] == player and
-                    board[row][col + 2] == player and
-                    board[row][col + 3] == player):
-                return True
-
-    # Check horizontally
-    for row in range(rows - 3):
-        for col in range(cols):
-            if (board[row][col] == player and
-                    board[row + 1][col] == player and
-                    board[row + 2][col] == player and
-                    board[row + 3][col] == player):
-                return True
-
-    # Check diagonally
-    for row in range(rows - 3):
-        for col in range(cols - 3):
-            if (board[row][col] == player and
-                    board[row + 1][col + 1] == player and
-                    board[row + 2][col + 2] == player and
-                    board[row + 3][col + 3] == player):
-                return True
-
-    # Check anti-diagonally
-    for row in range(3, rows):
-        for col in range(cols - 3):
-            if (board[row][col] == player and
-                    board[row - 1][col + 1] == player and
-                    board[row - 2][col + 2] == player and
-                    board[row - 3][col + 3] == player):
-                return True
+    player = board[row][col]
+    if player == 0:
+        return False
+
+    # Only the windows through this cell can have been completed by it
+    indices = get_cell_windows(rows, cols)[sub2ind(cols, row, col)]
+    windows = get_windows(rows, cols)[indices[indices >= 0]]
+    return bool((np.asarray(board).take(windows) == player).all(axis=1).any())
+
+def land(gui):
+    """Wait until every falling disc (see drop) has landed, redrawing the game window meanwhile.
+
+    Parameters
+    ----------
+    gui : GraphWin object or None
+        The main graphics window for the game (None when playing without graphics).
+    """
+    while gui is not None and gui.falling:
+        refresh(gui)
+
+def load_board(filename):
+    """Load a board state from a text file (see the boards directory for examples).
+
+    Parameters
+    ----------
+    filename : str
+        Text file with one string of digits per row, top row first.
+
+    Returns
+    -------
+    board : np.array of ints
+        2D array for the board state (0=empty, 1=player1, 2=player2), flipped so that
+        row 0 is the bottom of the board. Stack several with np.stack for is_gameover_batch.
+    """
+    data = np.loadtxt(filename, dtype=str, ndmin=1)
+    board = np.array([[int(char) for char in string] for string in data]) # convert data to 2D arrays of ints
+    return np.flipud(board) # flip to accommodate utility functions and position of (0,0) place on board
 
 def load_players(player1, player2, verbose=False):
     """Load AI players from file, if needed.
@@ -214,23 +516,31 @@ def load_players(player1, player2, verbose=False):
     Parameters
     ----------
     player1 : str
-        Name of Python file containing AI code for the first player, or 'human'.
+        Name of Python file containing AI code for the first player, the name of a file in
+        the players folder (e.g., 'minimax'), or 'human'.
     player2 : str
-        Name of Python file containing AI code for the second player, or 'human'.
+        Same, for the second player.
+    verbose : bool
+        Print progress, including how long each AI player took to import (default=False).
 
     Returns
     -------
     players : dict of lists
-        Dictionary of information for each player. Keys include 'name', 'id', and 'ai'.
-        For AI players, the 'ai' module must contain a get_computer_move function.
+        Dictionary of information for each player. Keys include 'name', 'id', 'ai', and
+        'engine'. For AI players, the 'ai' module must contain either a Player class (see
+        engine.py) or a get_computer_move function, and 'engine' is a new Player instance
+        or a FunctionPlayer wrapped around the function. Both are None for humans.
+        Modules are imported once per process (see registry.py) and shared by later games.
     """
     if verbose: print(f"Loading players...")
+    from engine import FunctionPlayer
 
     # Initialize output
     players = {
         'name': [player1, player2],
         'id': [None, None],
-        'ai': [None, None]}
+        'ai': [None, None],
+        'engine': [None, None]}
 
     # Try loading each player
     for i in range(2):
@@ -240,23 +550,98 @@ def load_players(player1, player2, verbose=False):
         else: # AI player
             if verbose: print(f"\tPlayer {i + 1} ({players['name'][i]})...", end="")
             try:
-                pathname, filename = os.path.split(os.path.abspath(players['name'][i]))
-                filename = ''.join(filename.split('.')[:-1])  # remove filename extension
-                players['name'][i] = filename  # simplify the player name for display
-                sys.path.append(pathname)  # add directory containing AI player to system path
-                players['ai'][i] = importlib.import_module(filename)
+                path = REGISTRY.path(players['name'][i])
+                cached = REGISTRY.is_loaded(path)
+                players['ai'][i] = REGISTRY.load(path)
+                players['name'][i] = os.path.splitext(os.path.basename(path))[0]  # simplify the player name for display
             except ImportError:
                 print(f"\n\tERROR: Cannot import AI player from file ({players['name'][i]})")
                 return 0
 
-            if not hasattr(players['ai'][i], 'get_computer_move'):
-                print(f"\n\tERROR: This AI player ({players['name'][i]}) does not have a 'get_computer_move' function")
+            if hasattr(players['ai'][i], 'Player'): # class-based player (see engine.py)
+                players['engine'][i] = players['ai'][i].Player()
+            elif hasattr(players['ai'][i], 'get_computer_move'):
+                players['engine'][i] = FunctionPlayer(players['ai'][i])
+            else:
+                print(f"\n\tERROR: This AI player ({players['name'][i]}) does not have a 'Player' class or a 'get_computer_move' function")
                 return 0
-            if verbose: print("complete")
+            if verbose: print("complete (already imported)" if cached else f"complete (imported in {REGISTRY.times[path]:.2f} seconds)")
             players['id'][i] = f"{players['name'][i].title()} ({'yellow' if i == 0 else 'red'})"
 
     return players
 
+def make_move(board, player, col):
+    """Drop a disc in a column, modifying the board in place (undo it with undo_move).
+
+    Searches can make and unmake moves on a single board instead of copying it at
+    every node.
+
+    Parameters
+    ----------
+    board : np.array of ints or Bitboard
+        2D array for the current state of the board (0=empty, 1=player1, 2=player2).
+    player : int
+        The player index (0-indexing) dropping the disc (ignored for a Bitboard, which
+        knows whose turn it is).
+    col : int
+        The column index (0-indexing) in which to drop the disc.
+
+    Returns
+    -------
+    row : int
+        The row index (0-indexing) where the disc landed.
+    """
+    if isinstance(board, Bitboard):
+        return board.play(col)
+    heights = getattr(board, 'heights', None)
+    row = np.count_nonzero(board[:, col]) if heights is None else heights[col]
+    board[row, col] = player + 1
+    if heights is not None: # only once the board has accepted the disc
+        heights[col] += 1
+    return row
+
+def mirror_move(col, cols, mirrored=True):
+    """Translate a column index (0-indexing) between a board and its mirror image.
+
+    Parameters
+    ----------
+    col : int or None
+        The column index (None is passed through unchanged).
+    cols : int
+        Number of columns on the board.
+    mirrored : bool
+        Whether to translate the move at all (e.g., the flag from canonicalize) (default=True).
+
+    Returns
+    -------
+    col : int or None
+        The column index in the other orientation.
+    """
+    if col is None or not mirrored:
+        return col
+    return cols - 1 - col
+
+def read_only(board):
+    """Return a read-only view of a board, which shares its memory instead of copying it.
+
+    Any attempt to modify the view raises a ValueError, so players can be handed the
+    game's board without a defensive copy. Players that want to modify it should make
+    their own copy first.
+
+    Parameters
+    ----------
+    board : np.array of ints
+        2D array for the current state of the board (0=empty, 1=player1, 2=player2).
+
+    Returns
+    -------
+    view : np.array of ints
+        The same board, with writing disabled.
+    """
+    view = board.view()
+    view.flags.writeable = False
+    return view
+
 def reset(gui, delay=1.0):
     """Reset the user interface elements in order to start a new game.
 
@@ -268,25 +653,58 @@ def reset(gui, delay=1.0):
         Amount of time to pause after resetting the game (default=1.0).
     """
     status(gui, "Starting new game...")
-    holes = gui.items[1:-1]
-    for hole in holes:
+    for disc, *_ in gui.falling:
+        disc.undraw()
+    gui.falling = []
+    for hole in gui.holes.values():
         hole.setFill(COLORS['background'])
+    refresh(gui)
     time.sleep(delay)
     status(gui, "")
 
-def setup(board):
+def refresh(gui, rate=FPS):
+    """Redraw the game window, if anything changed since the last redraw.
+
+    The window is created without autoflush (see setup), so drawing commands only
+    mark it as changed; this does the actual redraw, with a single Tk update, at most
+    rate times per second. Falling discs (see drop) move one frame each time.
+
+    Parameters
+    ----------
+    gui : GraphWin object or None
+        The main graphics window for the game (None when playing without graphics).
+    rate : float
+        Maximum number of redraws per second (default=FPS).
+    """
+    if gui is None:
+        return
+    if gui.falling:
+        animate(gui)
+    if not gui.dirty:
+        return
+    from graphics import update
+    gui.dirty = False
+    update(rate)
+
+def setup(board, animate=False):
     """Create the graphical user interface for the game.
     
     Parameters
     ----------
     board : np.array of ints
         The initial board state, which may (optionally) be non-empty.
+    animate : bool
+        Show discs falling into place, rather than just filling in their hole (default=False).
 
     Returns
     -------
     gui : GraphWin object
-        The graphics object containing all of the necessary UI elements.
+        The graphics object containing all of the necessary UI elements. The holes
+        are in gui.holes, a dict from (row, col) to Circle, and the status text is
+        gui.text (see drop and status). Discs that are still falling are in gui.falling.
     """
+    from graphics import Circle, GraphWin, Point, Rectangle, Text, update # requires a display
+
     # Input checking
     rows, cols = board.shape
     if rows < 4:
@@ -297,7 +715,7 @@ def setup(board):
     # Make game window
     wid = cols * (2.5 * DISC) + MARGIN * 2
     hei = rows * (2.5 * DISC) + MARGIN * 2 + HEADER
-    gui = GraphWin("Connect Four", wid, hei)
+    gui = GraphWin("Connect Four", wid, hei, autoflush=False) # drawn all at once (see refresh)
     gui.setCoords(0, 0, wid, hei) # put origin in bottom-left corner
 
     # Add board
@@ -308,6 +726,7 @@ def setup(board):
     rect.draw(gui)
 
     # Add holes (with optional starting discs if provided)
+    gui.holes = {}
     for row in range(rows):
         for col in range(cols):
             # Get position (in pixels)
@@ -328,13 +747,20 @@ def setup(board):
             hole.setOutline(COLORS['outline'])
             hole.setWidth(4)
             hole.draw(gui)
+            gui.holes[row, col] = hole
 
     # Add text instructions
     instructions = Text(Point(MARGIN, hei - (MARGIN + HEADER) // 2), "")
     instructions._reconfig("anchor", "w")
     instructions.setSize(FONT)
     instructions.draw(gui)
+    gui.text = instructions
 
+    # Show the window
+    update()
+    gui.animate = animate
+    gui.falling = [] # (disc, hole, color, start time, start y) for each falling disc
+    gui.dirty = False
     return gui
 
 def status(gui, msg):
@@ -342,13 +768,15 @@ def status(gui, msg):
 
     Parameters
     ----------
-    gui : GraphWin object
-        The main graphics window for the game.
+    gui : GraphWin object or None
+        The main graphics window for the game (None when playing without graphics).
     msg : str
         The text message to display in the gui.
     """
-    txt = gui.items[-1]
-    txt.setText(msg)
+    if gui is None:
+        return
+    gui.text.setText(msg)
+    gui.dirty = True
 
 def sub2ind(ncols, row, col):
     """Convert 2D subscripts (row, col) to a linear index based on the board size.
@@ -378,9 +806,10 @@ def test():
     print(f'    Making standard board...', end='')
     gui = setup()
     while True:
-        key = gui.checkKey()
+        key = gui.waitKey()
         if key:
             status(gui, key)
+            refresh(gui)
             if key == "Escape" or key == "Ctrl+e":  # exit game
                 break
             elif key == 'd':
@@ -393,5 +822,46 @@ def test():
     print(*board, sep='\n')
     print(f'rows = {rows}')
 
+def undo_move(board, col):
+    """Remove the top disc from a column, modifying the board in place (see make_move).
+
+    Parameters
+    ----------
+    board : np.array of ints or Bitboard
+        2D array for the current state of the board (0=empty, 1=player1, 2=player2). For a
+        Bitboard, the most recent move is undone, which must have been made in col.
+    col : int
+        The column index (0-indexing) of the disc to remove.
+
+    Returns
+    -------
+    row : int
+        The row index (0-indexing) the disc was removed from.
+    """
+    if isinstance(board, Bitboard):
+        board.undo()
+        return board.heights[col] - col * board.height
+    heights = getattr(board, 'heights', None)
+    row = (np.count_nonzero(board[:, col]) if heights is None else heights[col]) - 1
+    board[row, col] = 0
+    if heights is not None:
+        heights[col] -= 1
+    return row
+
+def wait(gui, delay):
+    """Pause for a while, keeping any falling discs (see drop) moving meanwhile.
+
+    Parameters
+    ----------
+    gui : GraphWin object or None
+        The main graphics window for the game (None when playing without graphics).
+    delay : float
+        Amount of time to pause, in seconds.
+    """
+    end = time.time() + delay
+    while gui is not None and gui.falling and time.time() < end:
+        refresh(gui)
+    time.sleep(max(0, end - time.time()))
+
 if __name__ == "__main__":
-    test()
\ No newline at end of file
+    test()